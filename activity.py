@@ -0,0 +1,139 @@
+"""Per-user diary activity index behind the calendar, heatmap and streaks.
+
+One small document per user and year in ``diary_activity`` maps each
+day (``MM-DD``) to the number of entries dated that day. Diary writes
+adjust it with ``$inc``, so the calendar page reads a single document
+(two around New Year, when a streak crosses it) instead of scanning
+entries. Like stats.py, a missing document is rebuilt from the entries
+(archive included) on first read, and increments never upsert.
+"""
+
+from datetime import date as date_type, datetime, timedelta
+
+import read_routing
+
+ACTIVITY_COLLECTION = 'diary_activity'
+
+DAY_FORMAT = '%m-%d'
+# Heatmap shading thresholds: entries per day at or above each level
+LEVELS = (1, 2, 3, 5)
+
+
+def activity_id(user_id, year):
+    return f'{user_id}:{year}'
+
+
+def year_pipeline(user_id, year):
+    match = {'user_id': user_id, 'date': {'$gte': datetime(year, 1, 1), '$lt': datetime(year + 1, 1, 1)}}
+    return [
+        {'$match': match},
+        {'$unionWith': {'coll': 'diary_archive', 'pipeline': [{'$match': match}]}},
+        {'$group': {'_id': {'$dateToString': {'format': DAY_FORMAT, 'date': '$date'}},
+                    'count': {'$sum': 1}}},
+    ]
+
+
+def compute_year(db, user_id, year):
+    return {group['_id']: group['count']
+            for group in db['diary'].aggregate(year_pipeline(user_id, year)) if group['_id']}
+
+
+def get_year(db, user_id, year, workload='interactive'):
+    """{'MM-DD': entries} for one year, materializing the document (from the primary) on first use."""
+    document = read_routing.collection(db, ACTIVITY_COLLECTION, workload).find_one(
+        {'_id': activity_id(user_id, year)}, {'days': 1})
+    if document is not None:
+        return {day: count for day, count in document.get('days', {}).items() if count > 0}
+    days = compute_year(db, user_id, year)
+    # $setOnInsert so a concurrent rebuild cannot clobber increments
+    db[ACTIVITY_COLLECTION].update_one(
+        {'_id': activity_id(user_id, year)},
+        {'$setOnInsert': {'user_id': user_id, 'year': year, 'days': days}}, upsert=True)
+    return days
+
+
+def _adjust(db, user_id, date, delta):
+    if not isinstance(date, datetime):
+        return
+    # No upsert: a missing document is rebuilt in full on the next read
+    db[ACTIVITY_COLLECTION].update_one(
+        {'_id': activity_id(user_id, date.year)},
+        {'$inc': {f'days.{date.strftime(DAY_FORMAT)}': delta}})
+
+
+def record_entry_added(db, user_id, date):
+    _adjust(db, user_id, date, 1)
+
+
+def record_entry_date_change(db, user_id, old_date, new_date):
+    if old_date != new_date:
+        _adjust(db, user_id, old_date, -1)
+        _adjust(db, user_id, new_date, 1)
+
+
+def record_entry_deleted(db, user_id, date):
+    _adjust(db, user_id, date, -1)
+
+
+def _count(years, day):
+    return years[day.year].get(day.strftime(DAY_FORMAT), 0)
+
+
+def _current_streak(db, user_id, years, today, workload):
+    """Consecutive days with entries ending today (or yesterday, if today is still blank)."""
+    day = today if _count(years, today) else today - timedelta(days=1)
+    streak = 0
+    while True:
+        if day.year not in years:
+            years[day.year] = get_year(db, user_id, day.year, workload)
+        if not _count(years, day):
+            return streak
+        streak += 1
+        day -= timedelta(days=1)
+
+
+def _level(count):
+    return sum(1 for threshold in LEVELS if count >= threshold)
+
+
+def build_calendar(db, user_id, year, today, workload='interactive'):
+    """Heatmap weeks, monthly totals and streaks for ``year``.
+
+    ``today`` is a date; the current streak is counted back from it and
+    may reach into earlier years.
+    """
+    years = {year: get_year(db, user_id, year, workload)}
+    if today.year != year:
+        years[today.year] = get_year(db, user_id, today.year, workload)
+
+    first, last = date_type(year, 1, 1), date_type(year, 12, 31)
+    # Weeks run Monday to Sunday; cells outside the year are padding
+    day = first - timedelta(days=first.weekday())
+    weeks, week = [], []
+    months = [0] * 12
+    longest = run = 0
+    while day <= last or week:
+        if first <= day <= last:
+            count = _count(years, day)
+            months[day.month - 1] += count
+            run = run + 1 if count else 0
+            longest = max(longest, run)
+            week.append({'date': day, 'count': count, 'level': _level(count),
+                         'future': day > today})
+        else:
+            week.append(None)
+        if len(week) == 7:
+            weeks.append(week)
+            week = []
+        day += timedelta(days=1)
+
+    return {
+        'year': year,
+        'weeks': weeks,
+        'months': [{'month': date_type(year, index + 1, 1), 'count': count}
+                   for index, count in enumerate(months)],
+        'total': sum(months),
+        'active_days': sum(1 for count in years[year].values() if count > 0),
+        'longest_streak': longest,
+        'current_streak': _current_streak(db, user_id, years, today, workload),
+    }
@@ -0,0 +1,73 @@
+"""Helpers for the versioned JSON API (``/api/v1``).
+
+Clients choose the fields they need with ``fields=name,due_date``. Only
+those fields are projected, so list views never pull diary bodies unless
+they ask for ``entry``. Responses carry a strong ETag derived from the
+user's data version (see data_version.py) and the request URL.
+"""
+
+import hashlib
+from datetime import datetime
+
+from bson import ObjectId
+
+from dates import format_date
+
+TASK_FIELDS = ('name', 'description', 'due_date', 'priority', 'status', 'created_at', 'updated_at')
+TASK_DEFAULT_FIELDS = ('name', 'description', 'due_date', 'priority', 'status')
+DIARY_FIELDS = ('title', 'entry', 'excerpt', 'word_count', 'date', 'tags', 'created_at', 'updated_at')
+# The entry body is the bulk of a diary document; lists omit it by default
+DIARY_DEFAULT_FIELDS = ('title', 'date', 'tags', 'excerpt', 'word_count')
+
+# Calendar-day fields are rendered as YYYY-MM-DD, timestamps as ISO 8601
+DAY_FIELDS = ('due_date', 'date')
+
+
+def parse_fields(value, allowed, default):
+    """Field names requested with ``fields=``; raises ValueError for unknown ones."""
+    if not value:
+        return list(default)
+    fields = []
+    for name in value.split(','):
+        name = name.strip()
+        if not name:
+            continue
+        if name not in allowed:
+            raise ValueError(f'unknown field {name!r}; allowed: {", ".join(allowed)}')
+        if name not in fields:
+            fields.append(name)
+    return fields or list(default)
+
+
+def projection(fields, *required):
+    """Projection for ``fields`` plus any fields the query needs (e.g. the sort key)."""
+    return {name: 1 for name in list(fields) + list(required)}
+
+
+def serialize(document, fields):
+    item = {'id': str(document['_id'])}
+    for name in fields:
+        value = document.get(name)
+        if name in DAY_FIELDS:
+            value = format_date(value) or None
+        elif isinstance(value, datetime):
+            value = value.isoformat()
+        elif isinstance(value, ObjectId):
+            value = str(value)
+        item[name] = value
+    return item
+
+
+def page_body(page, fields):
+    return {
+        'items': [serialize(document, fields) for document in page],
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor,
+    }
+
+
+def make_etag(user_id, version, url):
+    # The URL is part of the tag: different filters, fields or cursors are
+    # different representations of the same data version.
+    digest = hashlib.sha1(f'{user_id}:{url}'.encode()).hexdigest()[:16]
+    return f'v{version}-{digest}'
@@ -0,0 +1,163 @@
+"""Hot/cold archival of completed tasks and old diary entries.
+
+Completed tasks untouched for ``ARCHIVE_TASK_DAYS`` (and, if enabled,
+diary entries dated more than ``ARCHIVE_DIARY_DAYS`` ago) are moved to
+``tasks_archive``/``diary_archive`` in small batches. The hot collections
+and their indexes then hold mostly live work and stay small enough to be
+cached in RAM.
+
+A batch is copied first and deleted second. A crash in between leaves a
+duplicate that the next run skips over (duplicate key). A document that
+changed between the two steps (e.g. a task reopened) is not deleted, and
+its archive copy is dropped. Archived items still count in the user's
+stats; they leave the tag catalogue, which only lists tags for the diary
+page, and leave a sync tombstone (reason 'archived') so offline clients
+drop them too. ``restore()`` moves an item back.
+"""
+
+import logging
+import os
+import time
+from collections import Counter
+from datetime import timedelta
+
+from pymongo.errors import BulkWriteError
+
+from dates import utcnow
+import data_version
+import sync
+import tag_catalogue
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_TASK_DAYS = int(os.getenv('ARCHIVE_TASK_DAYS', '180'))
+# 0 disables diary archival
+ARCHIVE_DIARY_DAYS = int(os.getenv('ARCHIVE_DIARY_DAYS', '0'))
+ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', '500'))
+ARCHIVE_PAUSE = float(os.getenv('ARCHIVE_PAUSE', '0.5'))
+
+# kind -> (hot collection, archive collection)
+COLLECTIONS = {
+    'tasks': ('tasks', 'tasks_archive'),
+    'diary': ('diary', 'diary_archive'),
+}
+# kind -> the ``kind`` of its sync tombstones
+TOMBSTONE_KINDS = {'tasks': 'task', 'diary': 'diary'}
+
+_DUPLICATE_KEY = 11000
+
+
+def archive_criteria(kind, now=None):
+    """Query selecting the hot documents of ``kind`` due for archival, or None."""
+    now = now or utcnow()
+    if kind == 'tasks':
+        # updated_at is stamped on every change, including completion
+        return {'status': 'completed',
+                'updated_at': {'$lt': now - timedelta(days=ARCHIVE_TASK_DAYS)}}
+    if kind == 'diary' and ARCHIVE_DIARY_DAYS > 0:
+        cutoff = now - timedelta(days=ARCHIVE_DIARY_DAYS)
+        # updated_at too, so a restored or recently edited entry stays hot
+        return {'date': {'$lt': cutoff}, 'updated_at': {'$lt': cutoff}}
+    return None
+
+
+def _copy(archive, documents):
+    try:
+        archive.insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        # Left behind by an interrupted run; anything else is a real error
+        if any(error['code'] != _DUPLICATE_KEY for error in e.details.get('writeErrors', [])):
+            raise
+
+
+def _tag_deltas(documents, sign):
+    deltas = Counter()
+    for document in documents:
+        for tag in set(document.get('tags') or []):
+            deltas[(document['user_id'], tag)] += sign
+    return deltas
+
+
+def archive_batch(db, kind, criteria, batch_size=ARCHIVE_BATCH_SIZE):
+    """Move one batch; returns the number of documents archived."""
+    hot_name, archive_name = COLLECTIONS[kind]
+    hot, archive = db[hot_name], db[archive_name]
+    documents = list(hot.find(criteria).limit(batch_size))
+    if not documents:
+        return 0
+
+    archived_at = utcnow()
+    _copy(archive, [dict(document, archived_at=archived_at) for document in documents])
+    ids = [document['_id'] for document in documents]
+    deleted = hot.delete_many({'$and': [criteria, {'_id': {'$in': ids}}]}).deleted_count
+    if deleted != len(ids):
+        # Changed since the copy (e.g. reopened): keep the live version only
+        survivors = {document['_id'] for document in hot.find({'_id': {'$in': ids}}, {'_id': 1})}
+        archive.delete_many({'_id': {'$in': list(survivors)}})
+        documents = [document for document in documents if document['_id'] not in survivors]
+
+    if kind == 'diary':
+        tag_catalogue.adjust_tag_counts(db, _tag_deltas(documents, -1))
+    by_user = {}
+    for document in documents:
+        by_user.setdefault(document['user_id'], []).append(document['_id'])
+    for user_id, document_ids in by_user.items():
+        # Sync clients only read the hot collections: tell them it left
+        sync.record_deletions(db, user_id, TOMBSTONE_KINDS[kind], document_ids, reason='archived')
+        # Hot listings changed, so cached ETags and fragments must not match
+        data_version.bump(db, user_id)
+    return len(documents)
+
+
+def run_archival(db, kinds=None, batch_size=ARCHIVE_BATCH_SIZE, pause=ARCHIVE_PAUSE,
+                 max_batches=None, dry_run=False):
+    """Archive everything due, ``batch_size`` at a time with ``pause`` between batches.
+
+    Returns {kind: number archived} (number due, with ``dry_run``).
+    """
+    report = {}
+    for kind in kinds or COLLECTIONS:
+        criteria = archive_criteria(kind)
+        if criteria is None:
+            continue
+        hot = db[COLLECTIONS[kind][0]]
+        if dry_run:
+            report[kind] = hot.count_documents(criteria)
+            continue
+        total = batches = 0
+        while max_batches is None or batches < max_batches:
+            moved = archive_batch(db, kind, criteria, batch_size)
+            if not moved:
+                break
+            total += moved
+            batches += 1
+            logger.info('archive %s: batch %d, %d moved so far', kind, batches, total)
+            if pause:
+                # Throttle so archival does not compete with live traffic
+                time.sleep(pause)
+        report[kind] = total
+    return report
+
+
+def restore(db, kind, user_id, document_id):
+    """Move one archived document back to its hot collection.
+
+    Returns False if it is not in the user's archive. ``updated_at`` is
+    refreshed, so the next archival run does not move it straight back
+    and sync clients see it again.
+    """
+    hot_name, archive_name = COLLECTIONS[kind]
+    document = db[archive_name].find_one({'_id': document_id, 'user_id': user_id})
+    if document is None:
+        return False
+    document.pop('archived_at', None)
+    document['updated_at'] = utcnow()
+    db[hot_name].replace_one({'_id': document_id}, document, upsert=True)
+    db[archive_name].delete_one({'_id': document_id})
+    # A client that has not synced since the archival must not apply the
+    # tombstone after the restored copy
+    sync.forget_deletions(db, user_id, [document_id])
+    if kind == 'diary':
+        tag_catalogue.adjust_tag_counts(db, _tag_deltas([document], 1))
+    data_version.bump(db, user_id)
+    return True
@@ -0,0 +1,125 @@
+"""Fingerprinted, precompressed static assets.
+
+``flask build-assets`` copies every file under ``static/css`` and
+``static/js`` to ``ASSETS_DIR``, named after a hash of its content
+(``css/themes.3f2a9c1b7d4e.css``). It also writes ``.gz`` and, when the
+optional ``brotli`` package is installed, ``.br`` variants next to each
+file. ``manifest.json`` maps source names to built names.
+
+Templates link assets through ``asset_url()``. Without a build it falls
+back to the plain static URL (development). With a build the URL names
+the content, so ``/assets/`` serves it as immutable for a year. A changed
+file gets a new name, so clients never revalidate an asset URL. Each
+response picks the smallest variant the client accepts.
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+
+from flask import abort, request, send_file, url_for
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # optional: only gzip variants are built without it
+    brotli = None
+
+SOURCE_DIRS = ('css', 'js')
+MANIFEST_NAME = 'manifest.json'
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Content-Encoding -> file suffix, in order of preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def _fingerprint(relative_path, data):
+    stem, ext = os.path.splitext(relative_path)
+    return f'{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(data)
+    os.replace(temporary, path)
+
+
+def build(static_folder, output_dir):
+    """Build fingerprinted and compressed assets; returns the manifest.
+
+    Files from earlier builds are left in place, so pages rendered by
+    workers still running the previous release keep loading.
+    """
+    manifest = {}
+    for source_dir in SOURCE_DIRS:
+        root = os.path.join(static_folder, source_dir)
+        for directory, _, filenames in os.walk(root):
+            for filename in sorted(filenames):
+                path = os.path.join(directory, filename)
+                relative_path = os.path.relpath(path, static_folder).replace(os.sep, '/')
+                with open(path, 'rb') as f:
+                    data = f.read()
+                built = _fingerprint(relative_path, data)
+                target = os.path.join(output_dir, built)
+                _write(target, data)
+                # mtime=0 keeps the .gz byte-identical across builds
+                variants = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+                if brotli is not None:
+                    variants['.br'] = brotli.compress(data, quality=11)
+                for suffix, compressed in variants.items():
+                    if len(compressed) < len(data):
+                        _write(target + suffix, compressed)
+                manifest[relative_path] = built
+    _write(os.path.join(output_dir, MANIFEST_NAME),
+           json.dumps(manifest, indent=2, sort_keys=True).encode())
+    return manifest
+
+
+class Assets:
+    def __init__(self):
+        self.directory = None
+        self.manifest = {}
+        self._built = frozenset()
+
+    def init_app(self, app, directory=None):
+        self.directory = directory or os.path.join(app.static_folder, 'dist')
+        self.load()
+
+    def load(self):
+        try:
+            with open(os.path.join(self.directory, MANIFEST_NAME)) as f:
+                self.manifest = json.load(f)
+        except (OSError, ValueError, TypeError):
+            self.manifest = {}
+        self._built = frozenset(self.manifest.values())
+
+    def url(self, filename):
+        """URL for a file under static/: fingerprinted when built, plain otherwise."""
+        built = self.manifest.get(filename)
+        if built is None:
+            return url_for('static', filename=filename)
+        return url_for('asset', filename=built)
+
+    def send(self, filename):
+        # Only built files: their names change with their content
+        if filename not in self._built:
+            abort(404)
+        path = safe_join(self.directory, filename)
+        if path is None or not os.path.isfile(path):
+            abort(404)
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        encoding = None
+        for name, suffix in ENCODINGS:
+            if request.accept_encodings[name] and os.path.isfile(path + suffix):
+                path, encoding = path + suffix, name
+                break
+        response = send_file(path, mimetype=mimetype, conditional=True)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Cache-Control'] = CACHE_CONTROL
+        response.vary.add('Accept-Encoding')
+        return response
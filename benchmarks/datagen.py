@@ -0,0 +1,169 @@
+"""Synthetic users, tasks and diary entries for benchmarking.
+
+Activity is skewed the way real usage is: a few heavy users own most of
+the documents (log-normal per-user volume), tags follow a Zipf-like
+distribution, diary entry lengths are log-normal, and tasks due in the
+past are mostly completed. A fixed seed makes every run reproducible.
+
+Documents carry the fields the app maintains on write (``overdue``,
+``updated_at``, ``excerpt``/``word_count``) and the tag catalogue is
+rebuilt, so the seeded database looks like one the app has been running
+on rather than one that still needs the sweeps and backfills.
+"""
+
+import random
+from datetime import datetime, timedelta
+
+from werkzeug.security import generate_password_hash
+
+from excerpts import excerpt_fields
+from reminders import is_overdue
+import tag_catalogue
+
+BENCH_PASSWORD = 'benchmark'
+INSERT_BATCH_SIZE = 1000
+
+WORDS = (
+    'project report meeting review exam lecture notes draft budget client '
+    'deadline research lab homework quiz essay slides demo release plan '
+    'design budget invoice call email follow sprint standup retro hiring '
+    'training workshop grading syllabus reading chapter thesis proposal '
+    'garden family weekend travel gym run coffee music movie book dinner '
+    'idea reflection mood sleep health friends walk city rain sunny morning '
+    'evening focus progress goal habit learning python mongo flask server '
+    'bug fix deploy test benchmark index query cache latency memory'
+).split()
+
+TAGS = (
+    'work personal ideas school health family travel reading goals gratitude '
+    'fitness money project meeting learning mood weekend friends food music'
+).split()
+
+ROLES = (('student', 0.6), ('teacher', 0.25), ('business', 0.15))
+PRIORITIES = (('high', 0.2), ('medium', 0.5), ('low', 0.3))
+
+
+def _weighted(rng, choices):
+    values, weights = zip(*choices)
+    return rng.choices(values, weights)[0]
+
+
+def _words(rng, count):
+    return ' '.join(rng.choice(WORDS) for _ in range(max(1, count)))
+
+
+def _date_value(day):
+    # Calendar days are stored as midnight BSON dates
+    return day.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _volumes(rng, users, mean):
+    """Per-user document counts with a heavy tail and the requested mean."""
+    raw = [rng.lognormvariate(0, 1.2) for _ in range(users)]
+    scale = mean * users / sum(raw) if raw else 0
+    return [int(round(value * scale)) for value in raw]
+
+
+def make_user(index, password_hash, rng):
+    return {
+        'email': f'bench-user-{index}@example.com',
+        'password': password_hash,
+        'role': _weighted(rng, ROLES),
+        'created_at': datetime.now() - timedelta(days=rng.randint(30, 900)),
+    }
+
+
+def make_task(user_id, rng, today):
+    due = today + timedelta(days=rng.randint(-180, 90))
+    overdue = due < today
+    status = 'completed' if rng.random() < (0.8 if overdue else 0.15) else 'pending'
+    created = due - timedelta(days=rng.randint(1, 30))
+    return {
+        'name': _words(rng, rng.randint(2, 6)).capitalize(),
+        'description': _words(rng, rng.randint(5, 40)),
+        'due_date': _date_value(due),
+        'priority': _weighted(rng, PRIORITIES),
+        'status': status,
+        # As the overdue sweep would have left it
+        'overdue': is_overdue(status, _date_value(due), today),
+        'user_id': user_id,
+        'created_at': created,
+        # Never in the future, or delta sync would hold it back as unsettled
+        'updated_at': min(created, today),
+    }
+
+
+def make_diary_entry(user_id, rng, today):
+    day = today - timedelta(days=int(rng.expovariate(1 / 120)) % 730)
+    tag_count = rng.choice((0, 1, 1, 2, 2, 3, 4))
+    # Zipf-like: earlier tags in the list are much more common
+    tags = sorted({TAGS[min(int(rng.paretovariate(1.2)) - 1, len(TAGS) - 1)] for _ in range(tag_count)})
+    entry = _words(rng, int(rng.lognormvariate(4.8, 0.8)))
+    created = datetime.combine(day, datetime.min.time())
+    return {
+        'user_id': user_id,
+        'title': _words(rng, rng.randint(2, 6)).capitalize(),
+        'entry': entry,
+        **excerpt_fields(entry),
+        'date': _date_value(day),
+        'tags': tags,
+        'created_at': created,
+        'updated_at': created,
+    }
+
+
+def _insert_batched(collection, documents):
+    batch = []
+    inserted = 0
+    for document in documents:
+        batch.append(document)
+        if len(batch) >= INSERT_BATCH_SIZE:
+            collection.insert_many(batch, ordered=False)
+            inserted += len(batch)
+            batch = []
+    if batch:
+        collection.insert_many(batch, ordered=False)
+        inserted += len(batch)
+    return inserted
+
+
+def seed(db, users=100, tasks_per_user=200, entries_per_user=100, seed=42):
+    """Insert a synthetic dataset into ``db`` and return a summary.
+
+    The summary lists the seeded user ids ordered from heaviest to
+    lightest, plus a common tag and word for filtered and search routes.
+    """
+    rng = random.Random(seed)
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    password_hash = generate_password_hash(BENCH_PASSWORD)
+
+    user_docs = [make_user(index, password_hash, rng) for index in range(users)]
+    db['users'].insert_many(user_docs)
+    user_ids = [str(doc['_id']) for doc in user_docs]
+
+    task_volumes = _volumes(rng, users, tasks_per_user)
+    entry_volumes = _volumes(rng, users, entries_per_user)
+
+    task_count = _insert_batched(db['tasks'], (
+        make_task(user_id, rng, today)
+        for user_id, volume in zip(user_ids, task_volumes)
+        for _ in range(volume)
+    ))
+    entry_count = _insert_batched(db['diary'], (
+        make_diary_entry(user_id, rng, today)
+        for user_id, volume in zip(user_ids, entry_volumes)
+        for _ in range(volume)
+    ))
+
+    tag_catalogue.rebuild_tag_catalogue(db)
+
+    by_volume = sorted(range(users), key=lambda i: task_volumes[i] + entry_volumes[i], reverse=True)
+    return {
+        'users': users,
+        'tasks': task_count,
+        'diary_entries': entry_count,
+        'user_ids': [user_ids[i] for i in by_volume],
+        'user_emails': [user_docs[i]['email'] for i in by_volume],
+        'common_tag': TAGS[0],
+        'common_word': 'project',
+    }
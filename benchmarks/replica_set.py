@@ -0,0 +1,258 @@
+"""Check read routing and read-your-own-writes on a local replica set.
+
+Starts three ``mongod`` processes on local ports as one replica set, points
+the app at it and drives routes through the test client. A command
+listener records which member served each read:
+
+- export, search and analytics (diary calendar) reads must reach a
+  secondary, and interactive page reads the primary (with the default
+  ``READ_PREFERENCE_*`` settings);
+- with replication paused on both secondaries (the ``rsSyncApplyStop``
+  failpoint, hence ``enableTestCommands``), a task added through the app
+  must still show up on the pages read right after it (they are pinned
+  to the primary), while the same export read unpinned misses it::
+
+    python -m benchmarks.replica_set
+    python -m benchmarks.replica_set --mongod /opt/mongodb/bin/mongod --base-port 27300
+
+Needs a local ``mongod`` binary (4.4 or later). The data directories live
+in a temporary folder that is removed afterwards unless ``--keep`` is given.
+Exits non-zero when a check fails.
+"""
+
+import argparse
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import date, timedelta
+
+from pymongo import MongoClient, monitoring
+from pymongo.errors import OperationFailure, PyMongoError
+
+REPLICA_SET = 'rs-dailysync-test'
+DB_NAME = 'task_diary_replica_test'
+PASSWORD = 'replica-check'
+STARTUP_TIMEOUT = 60
+
+
+class ReadRecorder(monitoring.CommandListener):
+    """(command, collection, server) for every read command the app sends."""
+
+    READ_COMMANDS = ('find', 'aggregate', 'count', 'distinct', 'getMore')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reads = []
+
+    def started(self, event):
+        if event.command_name not in self.READ_COMMANDS:
+            return
+        collection = event.command.get(event.command_name)
+        if event.command_name == 'getMore':
+            collection = event.command.get('collection')
+        with self._lock:
+            self.reads.append((event.command_name, collection, '%s:%s' % event.connection_id))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def take(self):
+        with self._lock:
+            reads, self.reads = self.reads, []
+        return reads
+
+
+def start_members(mongod, base_port, root):
+    processes = []
+    for index in range(3):
+        port = base_port + index
+        dbpath = os.path.join(root, f'member{index}')
+        os.makedirs(dbpath)
+        processes.append(subprocess.Popen([
+            mongod, '--replSet', REPLICA_SET, '--port', str(port), '--bind_ip', '127.0.0.1',
+            '--dbpath', dbpath, '--logpath', os.path.join(dbpath, 'mongod.log'),
+            '--setParameter', 'enableTestCommands=1',
+        ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+    return processes
+
+
+def direct_client(port):
+    return MongoClient('127.0.0.1', port, directConnection=True, serverSelectionTimeoutMS=2000)
+
+
+def wait_until(check, what, timeout=STARTUP_TIMEOUT):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if check():
+                return
+        except PyMongoError:
+            pass
+        time.sleep(0.5)
+    sys.exit(f'Timed out waiting for {what}')
+
+
+def initiate(base_port):
+    ports = [base_port + index for index in range(3)]
+    for port in ports:
+        wait_until(lambda port=port: direct_client(port).admin.command('ping'), f'mongod on {port}')
+    first = direct_client(ports[0])
+    # The first member is preferred as primary so the roles are predictable
+    first.admin.command('replSetInitiate', {'_id': REPLICA_SET, 'members': [
+        {'_id': index, 'host': f'127.0.0.1:{port}', 'priority': 2 if index == 0 else 1}
+        for index, port in enumerate(ports)]})
+
+    def ready():
+        states = [member['stateStr'] for member in
+                  first.admin.command('replSetGetStatus')['members']]
+        return states.count('PRIMARY') == 1 and states.count('SECONDARY') == 2
+    wait_until(ready, 'the replica set to elect a primary')
+    return {member['name']: member['stateStr']
+            for member in first.admin.command('replSetGetStatus')['members']}
+
+
+def set_replication_paused(roles, paused):
+    for name, role in roles.items():
+        if role == 'SECONDARY':
+            port = int(name.rsplit(':', 1)[1])
+            direct_client(port).admin.command(
+                'configureFailPoint', 'rsSyncApplyStop', mode='alwaysOn' if paused else 'off')
+
+
+class Checks:
+    def __init__(self):
+        self.failures = 0
+
+    def expect(self, ok, description):
+        print(f"{'ok  ' if ok else 'FAIL'}  {description}")
+        if not ok:
+            self.failures += 1
+
+
+def clear_pin(client):
+    import read_routing
+    with client.session_transaction() as session:
+        session.pop(read_routing._SESSION_KEY, None)
+
+
+def served_by(reads, collection, roles):
+    return {roles.get(server, server) for _, name, server in reads if name == collection}
+
+
+def check_routing(checks, client, recorder, roles):
+    routes = (
+        # (path, collection, expected member, workload)
+        ('/download_tasks', 'tasks', 'SECONDARY', 'export'),
+        ('/export_diary', 'diary', 'SECONDARY', 'export'),
+        ('/search_diary?query=replica', 'diary', 'SECONDARY', 'search'),
+        ('/tasks', 'tasks', 'PRIMARY', 'interactive'),
+        ('/diary/calendar', 'diary_activity', 'SECONDARY', 'analytics'),
+    )
+    for path, collection, expected, workload in routes:
+        clear_pin(client)
+        recorder.take()
+        response = client.get(path)
+        members = served_by(recorder.take(), collection, roles)
+        checks.expect(response.status_code == 200 and members == {expected},
+                      f'{workload:<12} {path:<30} {collection} read on {sorted(members) or "-"}, '
+                      f'expected {expected} (HTTP {response.status_code})')
+
+
+def check_read_your_writes(checks, client, recorder, roles):
+    name = f'replica-check-{uuid.uuid4().hex[:8]}'
+    set_replication_paused(roles, True)
+    try:
+        due_date = (date.today() + timedelta(days=7)).isoformat()
+        response = client.post('/add_task', data={'name': name, 'description': '',
+                                                  'due_date': due_date, 'priority': 'medium'},
+                               follow_redirects=True)
+        checks.expect(response.status_code == 200 and name.encode() in response.data,
+                      'redirect page after add_task shows the new task')
+
+        recorder.take()
+        response = client.get('/download_tasks')
+        members = served_by(recorder.take(), 'tasks', roles)
+        checks.expect(name.encode() in response.data and members == {'PRIMARY'},
+                      f'export right after the write reads the primary ({sorted(members)}) '
+                      'and includes the task')
+
+        clear_pin(client)
+        recorder.take()
+        response = client.get('/download_tasks')
+        members = served_by(recorder.take(), 'tasks', roles)
+        checks.expect(name.encode() not in response.data and members == {'SECONDARY'},
+                      f'control: an unpinned export reads a paused secondary ({sorted(members)}) '
+                      'and misses the task')
+    finally:
+        set_replication_paused(roles, False)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--mongod', default=shutil.which('mongod') or 'mongod',
+                        help='mongod binary (default: the one on PATH)')
+    parser.add_argument('--base-port', type=int, default=27217,
+                        help='port of the first member; the others use the next two')
+    parser.add_argument('--keep', action='store_true', help='keep the data directories')
+    parser.add_argument('--log-level', default='CRITICAL', help='application log level')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    root = tempfile.mkdtemp(prefix='dailysync-rs-')
+    processes = start_members(args.mongod, args.base_port, root)
+    try:
+        roles = initiate(args.base_port)
+        print(f'Replica set {REPLICA_SET}: '
+              + ', '.join(f'{name} {role}' for name, role in sorted(roles.items())))
+
+        # w=1: majority writes would wait for the paused secondaries
+        hosts = ','.join(f'127.0.0.1:{args.base_port + index}' for index in range(3))
+        from app import create_app, mongo
+        recorder = ReadRecorder()
+        mongo.event_listeners.append(recorder)
+        app = create_app({'MONGODB_URI': f'mongodb://{hosts}/?replicaSet={REPLICA_SET}&w=1',
+                          'MONGODB_DB': DB_NAME, 'SCHEDULER_ENABLED': False})
+        logging.getLogger().setLevel(args.log_level)
+
+        client = app.test_client()
+        email = f'replica-{uuid.uuid4().hex[:8]}@example.com'
+        client.post('/signup', data={'email': email, 'password': PASSWORD, 'role': 'student'})
+        response = client.post('/login', data={'email': email, 'password': PASSWORD})
+        if response.status_code != 302:
+            sys.exit(f'Could not log in (HTTP {response.status_code})')
+        # Let the secondaries replicate the account and indexes before routing reads there
+        time.sleep(2)
+
+        checks = Checks()
+        print('\nRouting')
+        check_routing(checks, client, recorder, roles)
+        print('\nRead-your-own-writes (replication paused)')
+        check_read_your_writes(checks, client, recorder, roles)
+        print(f'\n{checks.failures} check(s) failed' if checks.failures else '\nAll checks passed')
+        return 1 if checks.failures else 0
+    except OperationFailure as e:
+        sys.exit(f'Server error: {e}')
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+        if args.keep:
+            print(f'Data directories kept in {root}')
+        else:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,372 @@
+"""Route latency, throughput and memory benchmark.
+
+Seeds a dedicated database with synthetic data (see datagen.py), drives
+the Flask routes and writes per-route p50/p95/p99 latency, throughput,
+status codes and peak memory to a JSON file that later runs can be
+compared against::
+
+    # against a local MongoDB (the database is dropped and re-seeded)
+    python -m benchmarks.run --uri mongodb://localhost:27017 --users 200
+
+    # quick in-memory smoke run (needs the optional mongomock package;
+    # $text search and some aggregations are not supported there)
+    python -m benchmarks.run --in-memory --users 20
+
+    # compare with a saved baseline, failing on a >20% p95 regression
+    python -m benchmarks.run --uri ... --baseline benchmarks/results/baseline.json
+
+With ``--url`` the routes of an already running server are driven over
+HTTP instead (it must be connected to a database seeded by this tool and
+started with ``SCHEDULER_ENABLED=false``; peak memory is not available in
+that mode).
+
+A 200 is not enough for a request to count: responses whose dashboard
+panels fell back (the ``X-Degraded-Panels`` header) and, in-process, requests
+that logged a warning or error are reported as failed, left out of the
+latency figures, and make the run exit non-zero unless ``--allow-failures``
+is given. The app is created with its scheduler disabled.
+"""
+
+import argparse
+import http.cookiejar
+import json
+import logging
+import os
+import platform
+import sys
+import threading
+import time
+import tracemalloc
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter
+from datetime import datetime
+
+from benchmarks import datagen
+
+DEFAULT_DB_NAME = 'task_diary_bench'
+# Set by app.py when dashboard panels fell back to their error state
+DEGRADED_HEADER = 'X-Degraded-Panels'
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+
+def route_paths(summary):
+    return {
+        'index': '/',
+        'dashboard': '/dashboard',
+        'list_tasks': '/tasks',
+        'list_tasks_by_priority': '/tasks?sort=priority',
+        'list_tasks_pending': '/tasks?status=pending',
+        'overdue_tasks': '/tasks/overdue',
+        'diary': '/diary',
+        'diary_by_tag': '/diary?tag=' + urllib.parse.quote(summary['common_tag']),
+        'search_diary': '/search_diary?query=' + urllib.parse.quote(summary['common_word']),
+        'download_tasks': '/download_tasks',
+        'export_diary': '/export_diary',
+    }
+
+
+def percentile(sorted_values, fraction):
+    # Nearest-rank percentile
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(latencies, statuses, elapsed, peak_memory, failed=0):
+    # ``latencies`` only holds requests that did their work; ``failed``
+    # counts the ones that did not, whatever their status code
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'failed': failed,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3) if latencies else None,
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3) if latencies else None,
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3) if latencies else None,
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else None,
+        'statuses': {str(code): count for code, count in sorted(statuses.items())},
+        'peak_memory_kib': round(peak_memory / 1024, 1) if peak_memory is not None else None,
+    }
+
+
+class LoggedProblems(logging.Handler):
+    """Counts warnings and errors logged per thread.
+
+    Routes catch their exceptions and dashboard panels fall back when a
+    query fails, so a 200 alone does not mean the request did its work.
+    The test client runs each request on the calling thread, which lets a
+    problem logged during a request be pinned to that request.
+    """
+
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.counts = Counter()
+
+    def emit(self, record):
+        self.counts[record.thread] += 1
+
+    def count(self):
+        return self.counts[threading.get_ident()]
+
+
+class TestClientDriver:
+    """Drives the routes in-process through Flask's test client."""
+
+    def __init__(self, app, user_ids, problems):
+        self.app = app
+        self.user_ids = user_ids
+        self.problems = problems
+
+    def client(self, worker):
+        client = self.app.test_client()
+        user_id = self.user_ids[worker % len(self.user_ids)]
+        with client.session_transaction() as session:
+            session['user_id'] = user_id
+        return client
+
+    def get(self, client, path):
+        """(status, failed): failed when panels fell back or problems were logged."""
+        logged = self.problems.count()
+        response = client.get(path)
+        # Drain streamed bodies so exports are measured end to end
+        response.get_data()
+        failed = DEGRADED_HEADER in response.headers or self.problems.count() > logged
+        return response.status_code, failed
+
+
+class HttpDriver:
+    """Drives a running server over HTTP, logging in as the seeded users."""
+
+    def __init__(self, base_url, emails):
+        self.base_url = base_url.rstrip('/')
+        self.emails = emails
+
+    def client(self, worker):
+        jar = http.cookiejar.CookieJar()
+        opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+        form = urllib.parse.urlencode({
+            'email': self.emails[worker % len(self.emails)],
+            'password': datagen.BENCH_PASSWORD,
+        }).encode()
+        opener.open(self.base_url + '/login', form).read()
+        return opener
+
+    def get(self, opener, path):
+        """(status, failed): the server's logs are out of reach, so only degraded panels count."""
+        try:
+            with opener.open(self.base_url + path) as response:
+                while response.read(64 * 1024):
+                    pass
+                return response.status, DEGRADED_HEADER in response.headers
+        except urllib.error.HTTPError as e:
+            return e.code, False
+
+
+def run_route(driver, path, requests, concurrency, warmup, measure_memory):
+    clients = [driver.client(worker) for worker in range(concurrency)]
+    for client in clients:
+        for _ in range(warmup):
+            driver.get(client, path)
+
+    latencies = []
+    statuses = Counter()
+    failures = Counter()
+    lock = threading.Lock()
+    per_worker = [requests // concurrency + (1 if i < requests % concurrency else 0)
+                  for i in range(concurrency)]
+
+    def worker(client, count):
+        local_latencies, local_statuses, local_failures = [], Counter(), 0
+        for _ in range(count):
+            started = time.perf_counter()
+            status, failed = driver.get(client, path)
+            duration = time.perf_counter() - started
+            local_statuses[status] += 1
+            if failed:
+                # A request that gave up early must not pass as a fast success
+                local_failures += 1
+            else:
+                local_latencies.append(duration)
+        with lock:
+            latencies.extend(local_latencies)
+            statuses.update(local_statuses)
+            failures['failed'] += local_failures
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(client, count))
+               for client, count in zip(clients, per_worker)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    peak_memory = None
+    if measure_memory:
+        # Separate pass: tracemalloc slows allocation-heavy code noticeably
+        tracemalloc.start()
+        for _ in range(3):
+            driver.get(clients[0], path)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return summarize(latencies, statuses, elapsed, peak_memory, failures['failed'])
+
+
+def compare(results, baseline, threshold):
+    """Print p95 changes against ``baseline``; return the regressed routes."""
+    regressions = []
+    print(f"\n{'route':<26}{'base p95':>12}{'p95':>12}{'change':>10}")
+    for route, current in results['routes'].items():
+        previous = baseline.get('routes', {}).get(route)
+        if not previous or not previous.get('p95_ms') or current.get('p95_ms') is None:
+            continue
+        change = (current['p95_ms'] - previous['p95_ms']) / previous['p95_ms']
+        flag = '  REGRESSION' if change > threshold else ''
+        print(f"{route:<26}{previous['p95_ms']:>12.2f}{current['p95_ms']:>12.2f}{change:>+10.1%}{flag}")
+        if change > threshold:
+            regressions.append(route)
+    return regressions
+
+
+def build_app(args):
+    from app import create_app, mongo
+    if args.in_memory:
+        try:
+            import mongomock
+        except ImportError:
+            sys.exit('--in-memory needs the mongomock package (pip install mongomock)')
+        mongo.client_factory = mongomock.MongoClient
+    # The scheduler's sweeps and roll-ups would compete with the timed requests
+    config = {'MONGODB_DB': args.db_name, 'SCHEDULER_ENABLED': False}
+    if args.uri:
+        config['MONGODB_URI'] = args.uri
+    app = create_app(config)
+    # Keep tracebacks off the report, but let warnings and errors reach the
+    # handler that marks their requests as failed
+    root = logging.getLogger()
+    for handler in root.handlers:
+        handler.setLevel(args.log_level)
+    root.setLevel(min(logging.WARNING, logging.getLevelName(args.log_level.upper())))
+    problems = LoggedProblems()
+    root.addHandler(problems)
+    return app, mongo, problems
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--uri', help='MongoDB URI to seed and benchmark against')
+    target.add_argument('--in-memory', action='store_true', help='use mongomock instead of MongoDB')
+    parser.add_argument('--url', help='benchmark a running server at this base URL over HTTP')
+    parser.add_argument('--db-name', default=DEFAULT_DB_NAME,
+                        help=f'database to (re)create for the run (default {DEFAULT_DB_NAME})')
+    parser.add_argument('--no-seed', action='store_true', help='reuse the data already in --db-name')
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--tasks', type=int, default=200, help='mean tasks per user')
+    parser.add_argument('--entries', type=int, default=100, help='mean diary entries per user')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--requests', type=int, default=200, help='timed requests per route')
+    parser.add_argument('--warmup', type=int, default=5, help='untimed requests per client per route')
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--bench-users', type=int, default=10,
+                        help='spread requests over this many of the heaviest users')
+    parser.add_argument('--routes', help='comma-separated subset of routes to run')
+    parser.add_argument('--log-level', default='CRITICAL', help='application log level during the run')
+    parser.add_argument('--output', default=os.path.join(RESULTS_DIR, 'latest.json'))
+    parser.add_argument('--baseline', help='results JSON to compare against')
+    parser.add_argument('--allow-failures', action='store_true',
+                        help='exit zero even when requests degraded or logged errors')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='p95 increase treated as a regression (default 0.2 = 20%%)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    app, mongo, problems = build_app(args)
+    db = mongo.database
+
+    if args.no_seed:
+        users = list(db['users'].find({'email': {'$regex': '^bench-user-'}}, {'email': 1}))
+        summary = {
+            'users': len(users),
+            'user_ids': [str(user['_id']) for user in users],
+            'user_emails': [user['email'] for user in users],
+            'common_tag': datagen.TAGS[0],
+            'common_word': 'project',
+        }
+    else:
+        print(f"Seeding {args.db_name}: {args.users} users, ~{args.tasks} tasks "
+              f"and ~{args.entries} diary entries per user...")
+        mongo.client.drop_database(args.db_name)
+        started = time.perf_counter()
+        summary = datagen.seed(db, args.users, args.tasks, args.entries, args.seed)
+        # Create the declared indexes now rather than inside the first timed request
+        from indexes import ensure_indexes
+        ensure_indexes(db)
+        print(f"Seeded {summary['tasks']} tasks and {summary['diary_entries']} diary entries "
+              f"in {time.perf_counter() - started:.1f}s")
+
+    if not summary['user_ids']:
+        sys.exit('No benchmark users found; run without --no-seed first')
+
+    bench_users = max(1, min(args.bench_users, len(summary['user_ids'])))
+    if args.url:
+        driver = HttpDriver(args.url, summary['user_emails'][:bench_users])
+    else:
+        driver = TestClientDriver(app, summary['user_ids'][:bench_users], problems)
+
+    paths = route_paths(summary)
+    if args.routes:
+        wanted = set(args.routes.split(','))
+        paths = {name: path for name, path in paths.items() if name in wanted}
+
+    results = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'mode': 'http' if args.url else ('in-memory' if args.in_memory else 'test-client'),
+        'dataset': {key: summary.get(key) for key in ('users', 'tasks', 'diary_entries')},
+        'parameters': {key: getattr(args, key) for key in
+                       ('users', 'tasks', 'entries', 'seed', 'requests', 'warmup',
+                        'concurrency', 'bench_users')},
+        'routes': {},
+    }
+
+    print(f"\n{'route':<26}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'peak KiB':>10}{'failed':>8}  statuses")
+    for name, path in paths.items():
+        result = run_route(driver, path, args.requests, args.concurrency, args.warmup,
+                           measure_memory=not args.url)
+        results['routes'][name] = dict(result, path=path)
+        peak = result['peak_memory_kib'] if result['peak_memory_kib'] is not None else '-'
+        # Every request failing leaves no latencies to report
+        p50, p95, p99 = (f"{result[key]:.2f}" if result[key] is not None else '-'
+                         for key in ('p50_ms', 'p95_ms', 'p99_ms'))
+        print(f"{name:<26}{p50:>10}{p95:>10}{p99:>10}"
+              f"{result['throughput_rps']:>10.1f}{peak:>10}{result['failed']:>8}  {result['statuses']}")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    failed = [name for name, result in results['routes'].items() if result['failed']]
+    if failed and not args.allow_failures:
+        print(f"\nRequests degraded or logged errors on: {', '.join(failed)}")
+        return 1
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\np95 regressions above {args.threshold:.0%}: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
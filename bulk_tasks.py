@@ -0,0 +1,198 @@
+"""Bulk task operations and CSV/NDJSON task import.
+
+Bulk actions apply to many selected tasks in one ``bulk_write`` instead of
+one request and round trip per task. Imports read the upload line by line,
+validate each row and insert in batches with ``insert_many(ordered=False)``,
+so memory stays bounded by the batch size and one bad row does not stop
+the rest. Both paths rebuild the user's stats document once at the end
+rather than adjusting counters per task.
+"""
+
+import codecs
+import csv
+import json
+import os
+from datetime import datetime
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import DeleteOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from dates import parse_date, utcnow
+from reminders import is_overdue
+
+PRIORITIES = ('low', 'medium', 'high')
+STATUSES = ('pending', 'completed')
+BULK_ACTIONS = ('complete', 'reopen', 'reprioritize', 'delete')
+
+# Upper bound on tasks touched by one bulk action
+MAX_BULK_TASKS = 1000
+IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', 1000))
+# Only the first errors are kept for the report; the rest are counted
+MAX_REPORTED_ERRORS = 100
+
+
+def parse_task_ids(values):
+    """ObjectIds for the valid ids in ``values``, deduplicated, in order."""
+    ids = []
+    for value in values:
+        try:
+            object_id = ObjectId(value)
+        except (InvalidId, TypeError):
+            continue
+        if object_id not in ids:
+            ids.append(object_id)
+    return ids[:MAX_BULK_TASKS]
+
+
+def owned_task_ids(collection, user_id, task_ids):
+    """The subset of ``task_ids`` that exist and belong to ``user_id``."""
+    return [task['_id'] for task in
+            collection.find({'_id': {'$in': task_ids}, 'user_id': user_id}, {'_id': 1})]
+
+
+def bulk_operations(user_id, task_ids, action, priority=None):
+    now = utcnow()
+    if action == 'complete':
+        update = {'$set': {'status': 'completed', 'updated_at': now}}
+    elif action == 'reopen':
+        update = {'$set': {'status': 'pending', 'updated_at': now}}
+    elif action == 'reprioritize':
+        if priority not in PRIORITIES:
+            raise ValueError(f'Unknown priority: {priority!r}')
+        update = {'$set': {'priority': priority, 'updated_at': now}}
+    elif action == 'delete':
+        return [DeleteOne({'_id': task_id, 'user_id': user_id}) for task_id in task_ids]
+    else:
+        raise ValueError(f'Unknown bulk action: {action!r}')
+    return [UpdateOne({'_id': task_id, 'user_id': user_id}, update) for task_id in task_ids]
+
+
+def apply_bulk_action(collection, user_id, task_ids, action, priority=None):
+    """Apply ``action`` to the user's tasks in one unordered bulk_write.
+
+    Every operation is scoped by ``user_id`` so ids belonging to someone
+    else simply match nothing. Returns the number of tasks changed.
+    """
+    operations = bulk_operations(user_id, task_ids, action, priority)
+    if not operations:
+        return 0
+    result = collection.bulk_write(operations, ordered=False)
+    return result.deleted_count if action == 'delete' else result.modified_count
+
+
+class ImportReport:
+    def __init__(self):
+        self.rows = 0
+        self.inserted = 0
+        self.error_count = 0
+        self.errors = []
+
+    def error(self, row, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row, 'error': message})
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'inserted': self.inserted,
+            'failed': self.error_count,
+            'errors': self.errors,
+        }
+
+
+def validate_task(row, user_id, now, stamped_at):
+    """Build a task document from an import row; raises ValueError if invalid."""
+    if not isinstance(row, dict):
+        raise ValueError('expected an object')
+    name = str(row.get('name') or '').strip()
+    if not name:
+        raise ValueError('name is required')
+    due_date = parse_date(row.get('due_date'))
+    if due_date is None:
+        raise ValueError(f"invalid due_date {row.get('due_date')!r} (expected YYYY-MM-DD)")
+    priority = str(row.get('priority') or 'medium').strip().lower()
+    if priority not in PRIORITIES:
+        raise ValueError(f'invalid priority {priority!r}')
+    status = str(row.get('status') or 'pending').strip().lower()
+    if status not in STATUSES:
+        raise ValueError(f'invalid status {status!r}')
+    return {
+        'name': name,
+        'description': str(row.get('description') or '').strip(),
+        'due_date': due_date,
+        'priority': priority,
+        'status': status,
+        'overdue': is_overdue(status, due_date),
+        'user_id': user_id,
+        'created_at': now,
+        'updated_at': stamped_at,
+    }
+
+
+def csv_rows(lines):
+    """(row number, dict) pairs; row 1 is the header."""
+    reader = csv.DictReader(lines)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def ndjson_rows(lines):
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError as e:
+            yield number, e
+
+
+def _insert_batch(collection, batch, report):
+    documents = [document for _, document in batch]
+    try:
+        result = collection.insert_many(documents, ordered=False)
+        report.inserted += len(result.inserted_ids)
+    except BulkWriteError as e:
+        details = e.details
+        report.inserted += details.get('nInserted', 0)
+        for write_error in details.get('writeErrors', []):
+            report.error(batch[write_error['index']][0], write_error.get('errmsg', 'write failed'))
+
+
+def import_tasks(collection, user_id, stream, fmt, batch_size=IMPORT_BATCH_SIZE):
+    """Import tasks from a binary ``stream`` of CSV or NDJSON.
+
+    The stream is decoded incrementally and rows are inserted
+    ``batch_size`` at a time. Returns an :class:`ImportReport`.
+    """
+    if fmt not in ('csv', 'ndjson'):
+        raise ValueError(f'Unsupported import format: {fmt!r}')
+    # utf-8-sig drops the byte order mark spreadsheet exports like to add
+    lines = codecs.iterdecode(stream, 'utf-8-sig')
+    rows = csv_rows(lines) if fmt == 'csv' else ndjson_rows(lines)
+
+    report = ImportReport()
+    now, stamped_at = datetime.now(), utcnow()
+    batch = []
+    try:
+        for number, row in rows:
+            report.rows += 1
+            if isinstance(row, Exception):
+                report.error(number, f'invalid JSON: {row}')
+                continue
+            try:
+                batch.append((number, validate_task(row, user_id, now, stamped_at)))
+            except ValueError as e:
+                report.error(number, str(e))
+                continue
+            if len(batch) >= batch_size:
+                _insert_batch(collection, batch, report)
+                batch = []
+    except (UnicodeDecodeError, csv.Error) as e:
+        # The rest of the file cannot be read; keep what was imported
+        report.error(report.rows + 1, f'unreadable input: {e}')
+    if batch:
+        _insert_batch(collection, batch, report)
+    return report
@@ -0,0 +1,48 @@
+"""Per-user data version used for ETags and cache keys.
+
+Every write to a user's tasks or diary calls ``bump()``, which increments
+a counter in the ``data_versions`` collection. Readers call
+``get_version()``. That is served from an in-process TTL cache, so a
+conditional GET whose ETag still matches is answered without a database
+round trip. The worker that made a write sees the new version at once.
+Other workers may serve the previous one for up to ``DATA_VERSION_TTL``
+seconds; set it to 0 to always read the counter (one ``_id`` lookup).
+Callers pass ``fresh=True`` to read the counter for a user whose own
+write may have gone to another worker (see read_routing.own_write_pending).
+"""
+
+import os
+
+from pymongo import ReturnDocument
+
+from cache import TTLCache
+
+VERSIONS_COLLECTION = 'data_versions'
+
+version_cache = TTLCache(
+    maxsize=int(os.getenv('DATA_VERSION_CACHE_SIZE', '4096')),
+    ttl=float(os.getenv('DATA_VERSION_TTL', '5')),
+)
+
+
+def get_version(db, user_id, fresh=False):
+    version = None if fresh else version_cache.get(user_id)
+    if version is None:
+        document = db[VERSIONS_COLLECTION].find_one({'_id': user_id})
+        version = document['version'] if document else 0
+        if version_cache.ttl > 0:
+            version_cache.set(user_id, version)
+    return version
+
+
+def bump(db, user_id):
+    """Record that the user's data changed; returns the new version."""
+    document = db[VERSIONS_COLLECTION].find_one_and_update(
+        {'_id': user_id},
+        {'$inc': {'version': 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    if version_cache.ttl > 0:
+        version_cache.set(user_id, document['version'])
+    return document['version']
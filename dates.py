@@ -0,0 +1,45 @@
+"""Date handling for the calendar-day fields (task ``due_date``, diary ``date``).
+
+Those fields are stored as BSON dates at midnight (naive, which pymongo
+treats as UTC). Forms and query strings carry ``YYYY-MM-DD``; templates
+and exports format the stored value back the same way.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+DATE_FORMAT = '%Y-%m-%d'
+
+
+def parse_date(value):
+    """``YYYY-MM-DD`` (or a datetime) to a midnight datetime; None if invalid."""
+    if isinstance(value, datetime):
+        return value.replace(hour=0, minute=0, second=0, microsecond=0)
+    try:
+        return datetime.strptime((value or '').strip(), DATE_FORMAT)
+    except ValueError:
+        return None
+
+
+def format_date(value):
+    if isinstance(value, datetime):
+        return value.strftime(DATE_FORMAT)
+    return value or ''
+
+
+def utcnow():
+    """Naive UTC now, the form pymongo returns stored dates in.
+
+    Used for ``updated_at`` and other change timestamps that must order
+    consistently across processes and daylight-saving changes.
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def today():
+    return parse_date(datetime.now())
+
+
+def day_range(day):
+    """Query operator matching every instant of ``day``."""
+    return {'$gte': day, '$lt': day + timedelta(days=1)}
+
@@ -0,0 +1,45 @@
+"""Stored excerpts for diary list views.
+
+``add_diary``/``edit_diary`` store a short plain-text ``excerpt``, a
+``word_count`` and whether the excerpt was ``truncated`` next to the full
+``entry``. Listings and search results
+project only ``LIST_FIELDS``, so long bodies are neither decoded nor
+rendered until the reader asks for one.
+"""
+
+import os
+import re
+
+EXCERPT_LENGTH = int(os.getenv('DIARY_EXCERPT_LENGTH', '280'))
+
+# What diary listings and search results read from each document
+LIST_FIELDS = {'title': 1, 'date': 1, 'tags': 1, 'excerpt': 1, 'word_count': 1, 'truncated': 1}
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def word_count(text):
+    return len((text or '').split())
+
+
+def _one_line(text):
+    return _WHITESPACE.sub(' ', text or '').strip()
+
+
+def make_excerpt(text, length=EXCERPT_LENGTH):
+    """The start of ``text`` on one line, cut at a word boundary."""
+    text = _one_line(text)
+    if len(text) <= length:
+        return text
+    cut = text.rfind(' ', 0, length + 1)
+    if cut <= 0:
+        cut = length
+    return text[:cut].rstrip() + '…'
+
+
+def excerpt_fields(text):
+    """Fields to store alongside an entry body."""
+    # Stored rather than worked out in the template, whose word counting
+    # does not match word_count() for punctuation and hyphens
+    return {'excerpt': make_excerpt(text), 'word_count': word_count(text),
+            'truncated': len(_one_line(text)) > EXCERPT_LENGTH}
@@ -0,0 +1,138 @@
+"""Streaming task and diary exports.
+
+Documents are read from a batched cursor and turned into output lines one
+at a time, so an export holds at most one cursor batch and one output
+chunk in memory regardless of how much history the user has.
+"""
+
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+
+from flask import Response
+
+EXPORT_BATCH_SIZE = 500
+# Output is flushed to the client in chunks of roughly this many bytes
+CHUNK_SIZE = 64 * 1024
+
+FORMATS = {
+    'txt': 'text/plain',
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+TASK_FIELDS = ('name', 'description', 'due_date', 'priority', 'status')
+DIARY_FIELDS = ('date', 'title', 'entry', 'tags')
+
+
+def _value(value):
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d')
+    if isinstance(value, list):
+        return ', '.join(str(item) for item in value)
+    return '' if value is None else str(value)
+
+
+def task_text(task):
+    return (f'Task: {_value(task.get("name"))}, Description: {_value(task.get("description"))}, '
+            f'Due Date: {_value(task.get("due_date"))}, Priority: {_value(task.get("priority"))}, '
+            f'Status: {_value(task.get("status"))}\n')
+
+
+def diary_text(entry):
+    lines = [
+        f'Date: {_value(entry.get("date"))}\n',
+        f'Title: {_value(entry.get("title"))}\n',
+        f'Entry: {_value(entry.get("entry"))}\n',
+    ]
+    if entry.get('tags'):
+        lines.append(f'Tags: {_value(entry["tags"])}\n')
+    lines.append('\n---\n\n')
+    return ''.join(lines)
+
+
+TEXT_FORMATTERS = {
+    'tasks': task_text,
+    'diary': diary_text,
+}
+
+
+def text_rows(documents, formatter):
+    for document in documents:
+        yield formatter(document)
+
+
+def csv_rows(documents, fields):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for document in documents:
+        writer.writerow([_value(document.get(field)) for field in fields])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        # Header only: the cursor was empty
+        yield buffer.getvalue()
+
+
+def ndjson_rows(documents, fields):
+    for document in documents:
+        record = {}
+        for field in fields:
+            value = document.get(field)
+            record[field] = value.strftime('%Y-%m-%d') if isinstance(value, datetime) else value
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def coalesce(rows, chunk_size=CHUNK_SIZE):
+    """Join small rows into ~chunk_size byte chunks to keep write calls few."""
+    pending = []
+    size = 0
+    for row in rows:
+        data = row.encode('utf-8')
+        pending.append(data)
+        size += len(data)
+        if size >= chunk_size:
+            yield b''.join(pending)
+            pending = []
+            size = 0
+    if pending:
+        yield b''.join(pending)
+
+
+def gzip_stream(chunks):
+    # wbits=31 produces a gzip container rather than a raw zlib stream
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_response(cursor, kind, fields, fmt, filename, compress=False):
+    """Build a streaming Response for ``cursor`` in ``fmt`` (txt, csv or ndjson)."""
+    if fmt == 'csv':
+        rows = csv_rows(cursor, fields)
+    elif fmt == 'ndjson':
+        rows = ndjson_rows(cursor, fields)
+    else:
+        fmt = 'txt'
+        rows = text_rows(cursor, TEXT_FORMATTERS[kind])
+
+    body = coalesce(rows)
+    mimetype = FORMATS[fmt]
+    filename = f'{filename}.{fmt}'
+    if compress:
+        body = gzip_stream(body)
+        mimetype = 'application/gzip'
+        filename += '.gz'
+
+    return Response(
+        body,
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
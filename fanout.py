@@ -0,0 +1,111 @@
+"""Run a request's independent MongoDB reads concurrently.
+
+Pages that need several unrelated reads (the dashboard panels, a stats
+rebuild) submit them together, so the page waits roughly as long as the
+slowest read, not the sum of all round trips. Every call shares one
+deadline (``FANOUT_DEADLINE_MS``). Reads still running at the deadline
+are abandoned and left out of the result. Each call also runs under
+``pymongo.timeout()``, so the driver stops waiting on the server at
+about the same moment. Callers render whatever arrived and fall back
+for the rest.
+
+Calls run on worker threads without the Flask request context, so they
+must take everything they need (user id, collection) as arguments.
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import pymongo
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+FANOUT_WORKERS = int(os.getenv('FANOUT_WORKERS', '8'))
+FANOUT_DEADLINE_MS = int(os.getenv('FANOUT_DEADLINE_MS', '2000'))
+# For work that must finish once started (e.g. rebuilding a materialized document)
+NO_DEADLINE = float('inf')
+
+fanout_calls = metrics.registry.register(metrics.Counter(
+    'query_fanout_calls_total', 'Concurrent page reads by outcome.', ('outcome',)))
+fanout_duration = metrics.registry.register(metrics.Histogram(
+    'query_fanout_duration_seconds', 'Wall time of a concurrent batch of page reads.'))
+
+_executor = None
+_executor_pid = None
+_lock = threading.Lock()
+# Set on pool threads: a nested gather() runs inline so workers never wait on workers
+_local = threading.local()
+
+
+def _get_executor():
+    # Threads do not survive a fork; each worker process builds its own pool
+    global _executor, _executor_pid
+    with _lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix='fanout')
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def _run(function, expires):
+    if expires == NO_DEADLINE:
+        return function()
+    remaining = expires - time.monotonic()
+    if remaining <= 0:
+        raise TimeoutError('deadline passed before the query started')
+    with pymongo.timeout(remaining):
+        return function()
+
+
+def _run_on_worker(function, expires):
+    _local.active = True
+    try:
+        return _run(function, expires)
+    finally:
+        _local.active = False
+
+
+def gather(calls, deadline_ms=None):
+    """Run ``calls`` ({name: zero-argument callable}) concurrently.
+
+    Returns {name: result} for the calls that finished within the deadline
+    without raising. Failures are logged and late calls abandoned, so a
+    missing name means that part of the page must degrade. With
+    ``deadline_ms=NO_DEADLINE`` every call runs to completion.
+    """
+    if not calls:
+        return {}
+    deadline = (FANOUT_DEADLINE_MS if deadline_ms is None else deadline_ms) / 1000
+    started = time.monotonic()
+    expires = started + deadline
+    if len(calls) == 1 or getattr(_local, 'active', False):
+        # Nothing to overlap, or already on a pool thread: run inline
+        futures = None
+    else:
+        executor = _get_executor()
+        futures = {name: executor.submit(_run_on_worker, function, expires) for name, function in calls.items()}
+        wait(futures.values(), timeout=None if deadline == NO_DEADLINE else deadline)
+
+    results = {}
+    for name, function in calls.items():
+        try:
+            if futures is None:
+                results[name] = _run(function, expires)
+            elif not futures[name].done():
+                futures[name].cancel()
+                logger.warning('Query %s missed the %.0f ms deadline', name, deadline * 1000)
+                fanout_calls.inc('timeout')
+                continue
+            else:
+                results[name] = futures[name].result()
+            fanout_calls.inc('ok')
+        except Exception:
+            logger.exception('Query %s failed', name)
+            fanout_calls.inc('error')
+    fanout_duration.observe(value=time.monotonic() - started)
+    return results
@@ -0,0 +1,47 @@
+"""Per-user cache of rendered HTML fragments.
+
+Fragments are keyed by the user's data version (see data_version.py), so
+any task or diary write makes the old entries unreachable. Versions are
+read through a per-process cache, so after a write handled by another
+worker this one may serve the old fragment for up to ``DATA_VERSION_TTL``
+seconds. The user's own writes are not affected: views read the version
+fresh while the session's read-your-writes window is open (see
+app.current_version). Only fragments built from primary reads are cached:
+a lagging secondary could put old data under the new version, so callers
+pass ``cache=False`` for anything read elsewhere (see
+read_routing.reads_primary). The TTL only bounds how long unused entries
+occupy memory. On a hit the view skips both the queries behind the
+fragment and the template rendering.
+"""
+
+import os
+
+from markupsafe import Markup
+
+from cache import TTLCache
+
+fragment_cache = TTLCache(
+    maxsize=int(os.getenv('FRAGMENT_CACHE_SIZE', '2048')),
+    ttl=float(os.getenv('FRAGMENT_CACHE_TTL', '600')),
+)
+
+
+def get_fragment(name, user_id, version, *key):
+    """The cached fragment, or None (e.g. to decide which data to fetch)."""
+    return fragment_cache.get((name, user_id, version) + key)
+
+
+def store_fragment(html, name, user_id, version, *key, cache=True):
+    """``html`` as Markup, kept for later requests unless ``cache`` is false."""
+    html = Markup(html)
+    if cache:
+        fragment_cache.set((name, user_id, version) + key, html)
+    return html
+
+
+def cached_fragment(name, user_id, version, render, *key, cache=True):
+    """Return ``render()`` as Markup, cached under (name, user, version, *key)."""
+    html = get_fragment(name, user_id, version, *key) if cache else None
+    if html is None:
+        html = store_fragment(render(), name, user_id, version, *key, cache=cache)
+    return html
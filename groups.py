@@ -0,0 +1,87 @@
+"""Groups: a teacher's class or a business team.
+
+Teacher and business users own groups. Any user joins one with the
+group's join code, which shares their task and diary roll-ups (never the
+contents) with the owner. Every membership change stamps ``updated_at``,
+so the next roll-up run (see rollups.py) rebuilds that group.
+"""
+
+import secrets
+from datetime import datetime
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+from dates import utcnow
+
+GROUPS_COLLECTION = 'groups'
+# One pre-aggregated document per group, written by rollups.py
+GROUP_ROLLUPS_COLLECTION = 'group_rollups'
+OWNER_ROLES = ('teacher', 'business')
+
+
+def parse_group_id(group_id):
+    try:
+        return ObjectId(group_id)
+    except (InvalidId, TypeError):
+        return None
+
+
+def create_group(db, owner_id, name):
+    group = {
+        'name': name,
+        'owner_id': owner_id,
+        'member_ids': [],
+        'join_code': secrets.token_urlsafe(6),
+        'created_at': datetime.now(),
+        'updated_at': utcnow(),
+    }
+    db[GROUPS_COLLECTION].insert_one(group)
+    return group
+
+
+def owned_groups(db, owner_id):
+    return list(db[GROUPS_COLLECTION].find({'owner_id': owner_id}).sort('name', 1))
+
+
+def member_groups(db, user_id):
+    return list(db[GROUPS_COLLECTION].find({'member_ids': user_id},
+                                           {'name': 1, 'owner_id': 1}).sort('name', 1))
+
+
+def get_owned_group(db, group_id, owner_id):
+    group_id = parse_group_id(group_id)
+    if group_id is None:
+        return None
+    return db[GROUPS_COLLECTION].find_one({'_id': group_id, 'owner_id': owner_id})
+
+
+def join_group(db, user_id, join_code):
+    """Add the user to the group with ``join_code``; returns the group or None."""
+    return db[GROUPS_COLLECTION].find_one_and_update(
+        {'join_code': join_code, 'owner_id': {'$ne': user_id}},
+        {'$addToSet': {'member_ids': user_id}, '$set': {'updated_at': utcnow()}},
+        projection={'name': 1})
+
+
+def remove_member(db, group_id, user_id, owner_id=None):
+    """Take ``user_id`` out of the group (as its owner, or leaving it yourself)."""
+    group_id = parse_group_id(group_id)
+    if group_id is None:
+        return False
+    query = {'_id': group_id, 'member_ids': user_id}
+    if owner_id is not None:
+        query['owner_id'] = owner_id
+    result = db[GROUPS_COLLECTION].update_one(
+        query, {'$pull': {'member_ids': user_id}, '$set': {'updated_at': utcnow()}})
+    return result.modified_count == 1
+
+
+def delete_group(db, group_id, owner_id):
+    group_id = parse_group_id(group_id)
+    if group_id is None:
+        return False
+    if not db[GROUPS_COLLECTION].delete_one({'_id': group_id, 'owner_id': owner_id}).deleted_count:
+        return False
+    db[GROUP_ROLLUPS_COLLECTION].delete_one({'_id': group_id})
+    return True
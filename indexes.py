@@ -0,0 +1,230 @@
+"""Index declarations and query-plan diagnostics for the MongoDB collections."""
+
+from datetime import datetime
+
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+from pymongo.errors import OperationFailure
+
+from sync import TOMBSTONES_COLLECTION, TOMBSTONE_TTL_DAYS
+
+# Every index the application relies on, keyed by collection name.
+# Compound indexes follow equality -> sort -> range ordering so the
+# route queries below can be answered without a collection scan or an
+# in-memory sort. Sort keys end in _id, the keyset pagination tiebreaker.
+INDEXES = {
+    'tasks': [
+        IndexModel([('user_id', ASCENDING), ('due_date', ASCENDING), ('_id', ASCENDING)],
+                   name='user_due_date_id'),
+        IndexModel([('user_id', ASCENDING), ('priority', ASCENDING), ('_id', ASCENDING)],
+                   name='user_priority_id'),
+        IndexModel([('user_id', ASCENDING), ('status', ASCENDING), ('due_date', ASCENDING),
+                    ('_id', ASCENDING)],
+                   name='user_status_due_date_id'),
+        # Delta sync reads changes in (updated_at, _id) order
+        IndexModel([('user_id', ASCENDING), ('updated_at', ASCENDING), ('_id', ASCENDING)],
+                   name='user_updated_at_id'),
+        # Archival job: completed tasks not touched since the cutoff
+        IndexModel([('status', ASCENDING), ('updated_at', ASCENDING)],
+                   name='status_updated_at'),
+        # Overdue view and dashboard count
+        IndexModel([('user_id', ASCENDING), ('overdue', ASCENDING), ('due_date', ASCENDING),
+                    ('_id', ASCENDING)],
+                   name='user_overdue_due_date_id'),
+        # Overdue and reminder sweeps walk pending tasks in due-date order
+        IndexModel([('status', ASCENDING), ('due_date', ASCENDING), ('_id', ASCENDING)],
+                   name='status_due_date_id'),
+        # Roll-up job: documents changed since its last run
+        IndexModel([('updated_at', ASCENDING), ('user_id', ASCENDING)], name='updated_at_user'),
+    ],
+    'diary': [
+        IndexModel([('user_id', ASCENDING), ('date', DESCENDING), ('_id', DESCENDING)],
+                   name='user_date_id'),
+        IndexModel([('user_id', ASCENDING), ('tags', ASCENDING), ('date', DESCENDING),
+                    ('_id', DESCENDING)],
+                   name='user_tags_date_id'),
+        # user_id prefix: a search only walks the postings of one user
+        IndexModel([('user_id', ASCENDING), ('title', TEXT), ('entry', TEXT), ('tags', TEXT)],
+                   name='user_diary_text',
+                   weights={'title': 5, 'tags': 3, 'entry': 1},
+                   default_language='english'),
+        IndexModel([('user_id', ASCENDING), ('updated_at', ASCENDING), ('_id', ASCENDING)],
+                   name='user_updated_at_id'),
+        IndexModel([('date', ASCENDING), ('updated_at', ASCENDING)], name='date_updated_at'),
+        IndexModel([('updated_at', ASCENDING), ('user_id', ASCENDING)], name='updated_at_user'),
+    ],
+    # Cold storage (archive.py): the archive listing, search and restore
+    'tasks_archive': [
+        IndexModel([('user_id', ASCENDING), ('due_date', ASCENDING), ('_id', ASCENDING)],
+                   name='user_due_date_id'),
+    ],
+    'diary_archive': [
+        IndexModel([('user_id', ASCENDING), ('date', DESCENDING), ('_id', DESCENDING)],
+                   name='user_date_id'),
+        IndexModel([('user_id', ASCENDING), ('title', TEXT), ('entry', TEXT), ('tags', TEXT)],
+                   name='user_diary_text',
+                   weights={'title': 5, 'tags': 3, 'entry': 1},
+                   default_language='english'),
+    ],
+    TOMBSTONES_COLLECTION: [
+        IndexModel([('user_id', ASCENDING), ('deleted_at', ASCENDING), ('_id', ASCENDING)],
+                   name='user_deleted_at_id'),
+        IndexModel([('deleted_at', ASCENDING)], name='deleted_at_ttl',
+                   expireAfterSeconds=TOMBSTONE_TTL_DAYS * 24 * 3600),
+    ],
+    'diary_tags': [
+        IndexModel([('user_id', ASCENDING), ('tag', ASCENDING)],
+                   name='user_tag_unique', unique=True),
+    ],
+    # Groups and their roll-ups (groups.py, rollups.py)
+    'groups': [
+        IndexModel([('owner_id', ASCENDING), ('name', ASCENDING)], name='owner_name'),
+        IndexModel([('member_ids', ASCENDING), ('name', ASCENDING)], name='member_name'),
+        IndexModel([('join_code', ASCENDING)], name='join_code_unique', unique=True),
+    ],
+    'daily_rollups': [
+        IndexModel([('user_id', ASCENDING), ('day', ASCENDING)], name='user_day'),
+    ],
+    'group_rollups': [
+        IndexModel([('day', ASCENDING)], name='day'),
+    ],
+    # Reminder queue (reminders.py): one per task and due date
+    'notifications': [
+        IndexModel([('task_id', ASCENDING), ('kind', ASCENDING), ('due_date', ASCENDING)],
+                   name='task_kind_due_date_unique', unique=True),
+        IndexModel([('user_id', ASCENDING), ('read', ASCENDING), ('created_at', DESCENDING)],
+                   name='user_read_created_at'),
+    ],
+    'users': [
+        IndexModel([('email', ASCENDING)], name='email_unique', unique=True),
+    ],
+}
+
+# Indexes superseded by the declarations above; dropped by ensure_indexes().
+OBSOLETE_INDEXES = {
+    'tasks': ['user_due_date', 'user_priority', 'user_status_due_date'],
+    'diary': ['user_date', 'user_tags_date'],
+    # Could not serve the autocomplete's count sort after the tag prefix range
+    'diary_tags': ['user_tag_count'],
+}
+
+# Representative query shapes issued by the routes in app.py. The user id
+# is a placeholder: explain() only needs the shape, not matching data.
+SAMPLE_USER_ID = '000000000000000000000000'
+SAMPLE_DATE = datetime(2000, 1, 1)
+
+QUERY_SHAPES = [
+    ('stats rebuild: task counts', 'tasks',
+     {'user_id': SAMPLE_USER_ID}, None),
+    ('list_tasks: pending filter', 'tasks',
+     {'user_id': SAMPLE_USER_ID, 'status': 'pending'}, None),
+    ('dashboard: priority tasks', 'tasks',
+     {'user_id': SAMPLE_USER_ID, 'status': 'pending'}, [('due_date', 1), ('_id', 1)]),
+    ('list_tasks: sort=due_date', 'tasks',
+     {'user_id': SAMPLE_USER_ID}, [('due_date', 1), ('_id', 1)]),
+    ('list_tasks: sort=priority', 'tasks',
+     {'user_id': SAMPLE_USER_ID}, [('priority', 1), ('_id', 1)]),
+    ('list_tasks: status filter', 'tasks',
+     {'user_id': SAMPLE_USER_ID, 'status': 'pending'}, [('due_date', 1), ('_id', 1)]),
+    ('overdue_tasks', 'tasks',
+     {'user_id': SAMPLE_USER_ID, 'overdue': True}, [('due_date', 1), ('_id', 1)]),
+    ('overdue sweep', 'tasks',
+     {'status': 'pending', 'due_date': {'$lt': SAMPLE_DATE}}, [('due_date', 1), ('_id', 1)]),
+    ('diary', 'diary',
+     {'user_id': SAMPLE_USER_ID}, [('date', -1), ('_id', -1)]),
+    ('diary: date filter', 'diary',
+     {'user_id': SAMPLE_USER_ID, 'date': {'$gte': SAMPLE_DATE, '$lt': datetime(2000, 1, 2)}},
+     [('date', -1), ('_id', -1)]),
+    ('diary: tag filter', 'diary',
+     {'user_id': SAMPLE_USER_ID, 'tags': 'sample'}, [('date', -1), ('_id', -1)]),
+    ('search_diary', 'diary',
+     {'user_id': SAMPLE_USER_ID, '$text': {'$search': 'sample'}}, None),
+    ('sync: changed tasks', 'tasks',
+     {'user_id': SAMPLE_USER_ID}, [('updated_at', 1), ('_id', 1)]),
+    ('sync: changed diary entries', 'diary',
+     {'user_id': SAMPLE_USER_ID}, [('updated_at', 1), ('_id', 1)]),
+    ('sync: tombstones', TOMBSTONES_COLLECTION,
+     {'user_id': SAMPLE_USER_ID}, [('deleted_at', 1), ('_id', 1)]),
+    ('archive job: completed tasks', 'tasks',
+     {'status': 'completed', 'updated_at': {'$lt': SAMPLE_DATE}}, None),
+    ('archive: tasks', 'tasks_archive',
+     {'user_id': SAMPLE_USER_ID}, [('due_date', 1), ('_id', 1)]),
+    ('archive: diary', 'diary_archive',
+     {'user_id': SAMPLE_USER_ID}, [('date', -1), ('_id', -1)]),
+    ('archive: diary search', 'diary_archive',
+     {'user_id': SAMPLE_USER_ID, '$text': {'$search': 'sample'}}, None),
+    ('diary: tag dropdown', 'diary_tags',
+     {'user_id': SAMPLE_USER_ID, 'count': {'$gt': 0}}, [('tag', 1)]),
+    ('rollup job: changed tasks', 'tasks',
+     {'updated_at': {'$gte': SAMPLE_DATE}}, None),
+    ('rollup job: changed diary entries', 'diary',
+     {'updated_at': {'$gte': SAMPLE_DATE}}, None),
+    ('rollup job: touched days', 'tasks',
+     {'$or': [{'user_id': SAMPLE_USER_ID, 'due_date': {'$gte': SAMPLE_DATE, '$lt': SAMPLE_DATE}}]},
+     None),
+    ('rollup job: member days', 'daily_rollups',
+     {'user_id': {'$in': [SAMPLE_USER_ID]}}, None),
+    ('groups: owned', 'groups',
+     {'owner_id': SAMPLE_USER_ID}, [('name', 1)]),
+    ('groups: joined', 'groups',
+     {'member_ids': SAMPLE_USER_ID}, [('name', 1)]),
+    ('login/signup: user by email', 'users',
+     {'email': 'user@example.com'}, None),
+]
+
+BAD_STAGES = ('COLLSCAN', 'SORT')
+
+
+def ensure_indexes(db):
+    """Create every declared index and return the created names per collection.
+
+    create_indexes() is a no-op for indexes that already exist with the
+    same definition, so this is safe to run on every start.
+    """
+    for collection_name, names in OBSOLETE_INDEXES.items():
+        existing = db[collection_name].index_information()
+        for name in names:
+            if name in existing:
+                db[collection_name].drop_index(name)
+
+    created = {}
+    for collection_name, models in INDEXES.items():
+        created[collection_name] = db[collection_name].create_indexes(models)
+    return created
+
+
+def _plan_stages(plan):
+    # Walk a (possibly nested) explain plan and yield every stage name.
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            yield plan['stage']
+        for value in plan.values():
+            yield from _plan_stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from _plan_stages(item)
+
+
+def explain_query(collection, query, sort=None):
+    cursor = collection.find(query)
+    if sort:
+        cursor = cursor.sort(sort)
+    explanation = cursor.explain()
+    winning_plan = explanation.get('queryPlanner', {}).get('winningPlan', {})
+    return list(_plan_stages(winning_plan))
+
+
+def check_query_plans(db):
+    """Explain each route query shape and report collection scans and in-memory sorts.
+
+    Returns a list of (label, stages, problems) tuples.
+    """
+    report = []
+    for label, collection_name, query, sort in QUERY_SHAPES:
+        try:
+            stages = explain_query(db[collection_name], query, sort)
+        except OperationFailure as e:
+            report.append((label, [], [f'explain failed: {e}']))
+            continue
+        problems = [stage for stage in stages if stage in BAD_STAGES]
+        report.append((label, stages, problems))
+    return report
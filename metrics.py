@@ -0,0 +1,208 @@
+"""In-process metrics exposed in the Prometheus text format.
+
+Request latency is recorded per endpoint by hooks in app.py. MongoDB
+command latency is recorded per collection and command through pymongo's
+command monitoring, and commands slower than ``SLOW_QUERY_MS`` are logged
+with their values redacted. Each worker process keeps its own registry.
+"""
+
+import logging
+import os
+import threading
+from bisect import bisect_left
+
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '100'))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def set_total(self, *labels, value):
+        """Mirror a running total kept elsewhere (e.g. a cache's hit count)."""
+        with self._lock:
+            self._values[labels] = value
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            yield f'{self.name}{_labels(self.labelnames, labels)} {value}'
+
+
+class Gauge(Counter):
+    type = 'gauge'
+
+    def set(self, *labels, value):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, *labels, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self._lock:
+            snapshot = {labels: ([*counts], total, count)
+                        for labels, (counts, total, count) in self._series.items()}
+        for labels, (counts, total, count) in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield f'{self.name}_bucket{_labels(self.labelnames, labels, ("le", bound))} {cumulative}'
+            yield f'{self.name}_bucket{_labels(self.labelnames, labels, ("le", "+Inf"))} {count}'
+            yield f'{self.name}_sum{_labels(self.labelnames, labels)} {total}'
+            yield f'{self.name}_count{_labels(self.labelnames, labels)} {count}'
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def collector(self, callback):
+        """Register ``callback()`` to refresh gauges just before rendering."""
+        self.collectors.append(callback)
+        return callback
+
+    def render(self):
+        for callback in self.collectors:
+            try:
+                callback()
+            except Exception:
+                logger.exception('Metrics collector failed')
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+request_latency = registry.register(Histogram(
+    'http_request_duration_seconds', 'Request latency by endpoint.',
+    ('endpoint', 'method', 'status')))
+mongo_command_latency = registry.register(Histogram(
+    'mongodb_command_duration_seconds', 'MongoDB command latency by collection and command.',
+    ('collection', 'command')))
+mongo_command_failures = registry.register(Counter(
+    'mongodb_command_failures_total', 'Failed MongoDB commands by collection and command.',
+    ('collection', 'command')))
+slow_queries = registry.register(Counter(
+    'mongodb_slow_commands_total', 'MongoDB commands slower than SLOW_QUERY_MS.',
+    ('collection', 'command')))
+
+
+def redact(value, depth=0):
+    """Replace every literal in a command document with '?', keeping its shape."""
+    if depth > 8:
+        return '...'
+    if isinstance(value, dict):
+        return {key: redact(item, depth + 1) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(item, depth + 1) for item in value[:3]]
+    return '?'
+
+
+# Parts of a command worth showing in the slow query log
+_SHAPE_FIELDS = ('filter', 'sort', 'pipeline', 'query', 'updates', 'deletes')
+# Commands sent on the driver's own behalf, not by application code
+_IGNORED_COMMANDS = {'hello', 'ismaster', 'isMaster', 'ping', 'endSessions', 'saslStart', 'saslContinue'}
+
+
+class CommandTimer(monitoring.CommandListener):
+    def __init__(self, slow_query_ms=SLOW_QUERY_MS):
+        self.slow_query_ms = slow_query_ms
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def _key(self, event):
+        return (event.request_id, event.connection_id)
+
+    def started(self, event):
+        if event.command_name in _IGNORED_COMMANDS:
+            return
+        target = event.command.get(event.command_name)
+        if event.command_name == 'getMore':
+            # getMore names the cursor id; the collection is a separate field
+            target = event.command.get('collection')
+        collection = target if isinstance(target, str) else '-'
+        shape = None
+        if self.slow_query_ms >= 0:
+            shape = {field: redact(event.command[field])
+                     for field in _SHAPE_FIELDS if field in event.command}
+        with self._lock:
+            self._inflight[self._key(event)] = (collection, shape)
+
+    def _finish(self, event, failed):
+        with self._lock:
+            item = self._inflight.pop(self._key(event), None)
+        if item is None:
+            return
+        collection, shape = item
+        seconds = event.duration_micros / 1e6
+        mongo_command_latency.observe(collection, event.command_name, value=seconds)
+        if failed:
+            mongo_command_failures.inc(collection, event.command_name)
+        if self.slow_query_ms >= 0 and seconds * 1000 >= self.slow_query_ms:
+            slow_queries.inc(collection, event.command_name)
+            logger.warning('Slow MongoDB command %s on %s took %.1f ms: %s',
+                           event.command_name, collection, seconds * 1000, shape)
+
+    def succeeded(self, event):
+        self._finish(event, failed=False)
+
+    def failed(self, event):
+        self._finish(event, failed=True)
@@ -0,0 +1,153 @@
+"""Resumable, batched data migrations.
+
+Each migration walks its collection in ``_id`` order in fixed-size
+batches, applies one unordered ``bulk_write`` per batch and records the
+last processed ``_id`` in the ``migrations`` collection. An interrupted
+run therefore resumes where it stopped, and a dry run reports what would
+change without writing anything.
+"""
+
+import logging
+import time
+from datetime import datetime
+
+from pymongo import UpdateOne
+
+from dates import parse_date
+from excerpts import excerpt_fields
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_COLLECTION = 'migrations'
+
+# Calendar-day fields that used to be stored as 'YYYY-MM-DD' strings
+STRING_DATE_FIELDS = (('tasks', 'due_date'), ('diary', 'date'))
+# Collections whose documents must all carry updated_at for delta sync
+UPDATED_AT_COLLECTIONS = ('tasks', 'diary')
+
+
+def _checkpoint(db, migration_id):
+    return db[MIGRATIONS_COLLECTION].find_one({'_id': migration_id}) or {}
+
+
+def _save_checkpoint(db, migration_id, fields):
+    fields = dict(fields, updated_at=datetime.now())
+    db[MIGRATIONS_COLLECTION].update_one({'_id': migration_id}, {'$set': fields}, upsert=True)
+
+
+def run_migration(db, migration_id, collection_name, query, projection, transform,
+                  batch_size=1000, dry_run=False, restart=False, pause=0.0):
+    """Apply ``transform`` to every document matching ``query``, in batches.
+
+    ``transform(document)`` returns an UpdateOne, or raises ValueError for a
+    document that cannot be migrated (it is left alone and reported).
+    Returns a report dict.
+    """
+    collection = db[collection_name]
+    if restart and not dry_run:
+        db[MIGRATIONS_COLLECTION].delete_one({'_id': migration_id})
+    state = {} if restart else _checkpoint(db, migration_id)
+    last_id = state.get('last_id')
+    report = {
+        'migration': migration_id,
+        'converted': state.get('converted', 0) if not dry_run else 0,
+        'invalid': state.get('invalid', 0) if not dry_run else 0,
+        'invalid_sample': [],
+        'batches': 0,
+    }
+    if state.get('completed_at') and not restart:
+        report['skipped'] = 'already completed'
+        return report
+
+    while True:
+        batch_query = dict(query)
+        if last_id is not None:
+            batch_query['_id'] = {'$gt': last_id}
+        batch = list(collection.find(batch_query, projection).sort('_id', 1).limit(batch_size))
+        if not batch:
+            break
+
+        operations = []
+        for document in batch:
+            try:
+                operations.append(transform(document))
+            except ValueError as e:
+                # Left untouched and reported; needs a manual decision
+                report['invalid'] += 1
+                if len(report['invalid_sample']) < 20:
+                    report['invalid_sample'].append((str(document['_id']), str(e)))
+
+        if operations and not dry_run:
+            result = collection.bulk_write(operations, ordered=False)
+            report['converted'] += result.modified_count
+        elif dry_run:
+            report['converted'] += len(operations)
+
+        last_id = batch[-1]['_id']
+        report['batches'] += 1
+        if not dry_run:
+            _save_checkpoint(db, migration_id, {
+                'last_id': last_id,
+                'converted': report['converted'],
+                'invalid': report['invalid'],
+            })
+        logger.info('%s: batch %d done, %d converted so far', migration_id,
+                    report['batches'], report['converted'])
+        if pause:
+            # Throttle so a large migration does not starve live traffic
+            time.sleep(pause)
+
+    if not dry_run:
+        _save_checkpoint(db, migration_id, {'completed_at': datetime.now()})
+    return report
+
+
+def convert_string_dates(db, collection_name, field, **options):
+    """Rewrite string values of ``field`` as BSON dates."""
+    def transform(document):
+        parsed = parse_date(document[field])
+        if parsed is None:
+            raise ValueError(repr(document[field]))
+        # Matching on the old value too means a concurrent edit wins
+        return UpdateOne({'_id': document['_id'], field: document[field]},
+                         {'$set': {field: parsed}})
+
+    return run_migration(db, f'string_dates:{collection_name}.{field}', collection_name,
+                         {field: {'$type': 'string'}}, {field: 1}, transform, **options)
+
+
+def backfill_updated_at(db, collection_name, **options):
+    """Give documents written before ``updated_at`` was kept one.
+
+    The ObjectId creation time is used: it is UTC like ``updated_at`` and
+    present on every document, unlike the local-time ``created_at``.
+    """
+    def transform(document):
+        stamp = document['_id'].generation_time.replace(tzinfo=None)
+        return UpdateOne({'_id': document['_id'], 'updated_at': {'$exists': False}},
+                         {'$set': {'updated_at': stamp}})
+
+    return run_migration(db, f'updated_at:{collection_name}', collection_name,
+                         {'updated_at': {'$exists': False}}, {'_id': 1}, transform, **options)
+
+
+def backfill_diary_excerpts(db, **options):
+    """Store ``excerpt``, ``word_count`` and ``truncated`` on diary entries that lack them."""
+    def transform(document):
+        # Matching on the body too means a concurrent edit wins
+        return UpdateOne({'_id': document['_id'], 'entry': document.get('entry')},
+                         {'$set': excerpt_fields(document.get('entry'))})
+
+    # A new id: entries given an excerpt by the first version lack ``truncated``
+    return run_migration(db, 'diary_excerpts:truncated', 'diary',
+                         {'truncated': {'$exists': False}}, {'entry': 1}, transform, **options)
+
+
+def migrate_string_dates(db, **options):
+    return [convert_string_dates(db, collection_name, field, **options)
+            for collection_name, field in STRING_DATE_FIELDS]
+
+
+def backfill_all_updated_at(db, **options):
+    return [backfill_updated_at(db, collection_name, **options)
+            for collection_name in UPDATED_AT_COLLECTIONS]
@@ -0,0 +1,217 @@
+"""Lazily connected, fork-safe MongoDB access.
+
+Nothing connects at import time. The first database access in a process
+creates that process's ``MongoClient``, so a pre-forking server such as
+gunicorn gives every worker its own client and connection pool instead of
+sharing one created in the master. Client options come from the
+environment (see ``CLIENT_OPTIONS``).
+"""
+
+import logging
+import os
+import threading
+import time
+
+from pymongo import MongoClient, monitoring
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_URI = 'mongodb://localhost:27017/task_diary_db'
+DEFAULT_DB_NAME = 'task_diary_db'
+
+
+def _write_concern(value):
+    return int(value) if value.isdigit() else value
+
+
+def _bool(value):
+    return value.lower() in ('1', 'true', 'yes')
+
+
+# (environment variable, MongoClient keyword, parser)
+CLIENT_OPTIONS = [
+    ('MONGO_MAX_POOL_SIZE', 'maxPoolSize', int),
+    ('MONGO_MIN_POOL_SIZE', 'minPoolSize', int),
+    ('MONGO_MAX_IDLE_TIME_MS', 'maxIdleTimeMS', int),
+    ('MONGO_MAX_CONNECTING', 'maxConnecting', int),
+    ('MONGO_WAIT_QUEUE_TIMEOUT_MS', 'waitQueueTimeoutMS', int),
+    ('MONGO_CONNECT_TIMEOUT_MS', 'connectTimeoutMS', int),
+    ('MONGO_SOCKET_TIMEOUT_MS', 'socketTimeoutMS', int),
+    ('MONGO_SERVER_SELECTION_TIMEOUT_MS', 'serverSelectionTimeoutMS', int),
+    ('MONGO_COMPRESSORS', 'compressors', str),
+    ('MONGO_ZLIB_COMPRESSION_LEVEL', 'zlibCompressionLevel', int),
+    ('MONGO_WRITE_CONCERN', 'w', _write_concern),
+    ('MONGO_WRITE_CONCERN_TIMEOUT_MS', 'wTimeoutMS', int),
+    ('MONGO_JOURNAL', 'journal', _bool),
+    ('MONGO_APP_NAME', 'appname', str),
+]
+
+
+def client_options_from_env(environ=None):
+    environ = os.environ if environ is None else environ
+    options = {}
+    for variable, keyword, parse in CLIENT_OPTIONS:
+        value = environ.get(variable)
+        if value:
+            options[keyword] = parse(value)
+    return options
+
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    """Connection counts per server, fed by pymongo's pool events."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.servers = {}
+
+    def _bump(self, address, field, delta):
+        key = '%s:%s' % address
+        with self._lock:
+            counts = self.servers.setdefault(key, {'open': 0, 'checked_out': 0, 'checkout_failures': 0})
+            counts[field] += delta
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._bump(event.address, 'open', 1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._bump(event.address, 'open', -1)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._bump(event.address, 'checkout_failures', 1)
+
+    def connection_checked_out(self, event):
+        self._bump(event.address, 'checked_out', 1)
+
+    def connection_checked_in(self, event):
+        self._bump(event.address, 'checked_out', -1)
+
+    def snapshot(self):
+        with self._lock:
+            return {server: dict(counts) for server, counts in self.servers.items()}
+
+
+class LazyDatabase:
+    """Stands in for a pymongo Database, resolved on every access."""
+
+    def __init__(self, mongo):
+        self._mongo = mongo
+
+    def __getitem__(self, name):
+        return self._mongo.database[name]
+
+    def __getattr__(self, name):
+        return getattr(self._mongo.database, name)
+
+
+class LazyCollection:
+    """Stands in for a pymongo Collection, resolved on every access."""
+
+    def __init__(self, mongo, name):
+        self._mongo = mongo
+        self._name = name
+
+    def __getattr__(self, name):
+        return getattr(self._mongo.database[self._name], name)
+
+
+class Mongo:
+    def __init__(self, client_factory=MongoClient):
+        # Anything with MongoClient's signature; the benchmarks swap in an
+        # in-memory stand-in here.
+        self.client_factory = client_factory
+        self.uri = DEFAULT_URI
+        self.db_name = DEFAULT_DB_NAME
+        self.options = {}
+        self.event_listeners = []
+        self.pool_stats = None
+        self._on_connect = []
+        self._client = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.db = LazyDatabase(self)
+        if hasattr(os, 'register_at_fork'):
+            # The child must not reuse sockets or monitor threads inherited
+            # from the parent; forget the client and build a fresh one.
+            os.register_at_fork(after_in_child=self._forget_client)
+
+    def init_app(self, app):
+        self.uri = app.config.get('MONGODB_URI', self.uri)
+        self.db_name = app.config.get('MONGODB_DB', self.db_name)
+        self.options = dict(app.config.get('MONGODB_OPTIONS', {}))
+        app.extensions['mongo'] = self
+
+    def on_connect(self, callback):
+        """Run ``callback(database)`` whenever a process creates its client."""
+        self._on_connect.append(callback)
+        return callback
+
+    def collection(self, name):
+        return LazyCollection(self, name)
+
+    def _forget_client(self):
+        self._client = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None or self._pid != os.getpid():
+            with self._lock:
+                if self._client is None or self._pid != os.getpid():
+                    self.pool_stats = PoolStats()
+                    self._client = self.client_factory(
+                        self.uri,
+                        event_listeners=[self.pool_stats] + list(self.event_listeners),
+                        **self.options
+                    )
+                    self._pid = os.getpid()
+                    for callback in self._on_connect:
+                        try:
+                            callback(self._client[self.db_name])
+                        except Exception:
+                            logger.exception('Error in MongoDB on_connect hook')
+        return self._client
+
+    @property
+    def database(self):
+        return self.client[self.db_name]
+
+    def health(self):
+        """Ping the deployment and describe this process's pool."""
+        report = {
+            'pid': os.getpid(),
+            'connected': self._client is not None and self._pid == os.getpid(),
+            'max_pool_size': self.options.get('maxPoolSize', 100),
+        }
+        started = time.perf_counter()
+        try:
+            self.client.admin.command('ping')
+            report['ok'] = True
+        except Exception as e:
+            report['ok'] = False
+            report['error'] = str(e)
+        report['ping_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        report['servers'] = [
+            {'address': '%s:%s' % server.address, 'type': server.server_type_name}
+            for server in self.client.topology_description.server_descriptions().values()
+        ]
+        report['pools'] = self.pool_stats.snapshot() if self.pool_stats else {}
+        return report
@@ -0,0 +1,114 @@
+"""Keyset (cursor) pagination over a sort field with ``_id`` as tiebreaker.
+
+Pages are fetched by seeking past the last seen ``(value, _id)`` pair
+instead of skipping, so every page costs one bounded index range scan no
+matter how deep the user has paged. Cursors are opaque url-safe tokens.
+"""
+
+import base64
+import os
+
+from bson import json_util
+
+PAGE_SIZE = int(os.getenv('PAGE_SIZE', '20'))
+MAX_PAGE_SIZE = 100
+
+
+class Page:
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def encode_token(payload):
+    data = json_util.dumps(payload)
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def decode_token(token):
+    """Inverse of encode_token(); raises ValueError for a malformed token."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        return json_util.loads(base64.urlsafe_b64decode(padded))
+    except Exception as e:
+        raise ValueError(f'invalid cursor: {e}')
+
+
+def encode_cursor(field, document):
+    return encode_token([field, document.get(field), document['_id']])
+
+
+def decode_cursor(token, field):
+    """Return (value, _id) for a cursor issued for ``field``, or None if invalid."""
+    if not token:
+        return None
+    try:
+        cursor_field, value, oid = decode_token(token)
+    except (ValueError, TypeError):
+        return None
+    # A cursor from another sort order cannot be applied to this one
+    if cursor_field != field:
+        return None
+    return value, oid
+
+
+def _seek(field, value, oid, increasing):
+    # MongoDB sorts null/missing below every other value and a range
+    # operator never matches across types, so nulls are handled explicitly.
+    if increasing:
+        if value is None:
+            return {'$or': [{field: {'$ne': None}},
+                            {field: None, '_id': {'$gt': oid}}]}
+        return {'$or': [{field: {'$gt': value}},
+                        {field: value, '_id': {'$gt': oid}}]}
+    if value is None:
+        return {field: None, '_id': {'$lt': oid}}
+    return {'$or': [{field: {'$lt': value}},
+                    {field: value, '_id': {'$lt': oid}},
+                    {field: None}]}
+
+
+def paginate(collection, query, sort_field, direction=1, after=None, before=None,
+             page_size=PAGE_SIZE, projection=None):
+    """Return one Page of ``collection.find(query)`` ordered by ``sort_field``.
+
+    ``after``/``before`` are cursors taken from a previous page's
+    ``next_cursor``/``prev_cursor``. At most ``page_size + 1`` documents
+    are read from the server.
+    """
+    page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+    after_key = decode_cursor(after, sort_field)
+    before_key = decode_cursor(before, sort_field) if after_key is None else None
+
+    # Walking backwards means reading in the opposite order and flipping
+    # the page afterwards.
+    backwards = before_key is not None
+    read_direction = -direction if backwards else direction
+    key = before_key if backwards else after_key
+
+    if key is not None:
+        query = {'$and': [query, _seek(sort_field, key[0], key[1], read_direction == 1)]}
+
+    cursor = collection.find(query, projection).sort(
+        [(sort_field, read_direction), ('_id', read_direction)]
+    ).limit(page_size + 1)
+    items = list(cursor)
+    has_more = len(items) > page_size
+    items = items[:page_size]
+    if backwards:
+        items.reverse()
+
+    next_cursor = prev_cursor = None
+    if items:
+        if has_more or backwards:
+            next_cursor = encode_cursor(sort_field, items[-1])
+        if (has_more and backwards) or (key is not None and not backwards):
+            prev_cursor = encode_cursor(sort_field, items[0])
+    return Page(items, next_cursor, prev_cursor)
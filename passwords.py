@@ -0,0 +1,146 @@
+"""Password hashing on a bounded worker pool.
+
+Hashing is deliberately CPU-heavy, so it runs on a small thread pool
+(bcrypt and hashlib release the GIL while they work). At most
+``HASH_WORKERS`` hashes run at once per process and at most
+``HASH_QUEUE_LIMIT`` may wait. Beyond that ``HashingBusy`` is raised
+straight away, so a login burst cannot tie up every request thread.
+
+New hashes use ``PASSWORD_SCHEME``: ``bcrypt`` (cost ``BCRYPT_ROUNDS``)
+or ``werkzeug`` (``PASSWORD_METHOD``, e.g. ``scrypt``). Stored hashes in
+any supported format still verify, and ``needs_rehash()`` reports those
+made with other parameters so login can upgrade them.
+"""
+
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from functools import lru_cache
+
+import bcrypt
+from werkzeug.security import check_password_hash, generate_password_hash
+
+import metrics
+
+PASSWORD_SCHEME = os.getenv('PASSWORD_SCHEME', 'bcrypt')
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', '12'))
+PASSWORD_METHOD = os.getenv('PASSWORD_METHOD', 'scrypt')
+HASH_WORKERS = int(os.getenv('HASH_WORKERS', '2'))
+HASH_QUEUE_LIMIT = int(os.getenv('HASH_QUEUE_LIMIT', '16'))
+# How long a request waits for its hash before giving up
+HASH_TIMEOUT = float(os.getenv('HASH_TIMEOUT', '5'))
+
+_BCRYPT_HASH = re.compile(r'^\$2[aby]\$(\d{2})\$')
+
+hash_duration = metrics.registry.register(metrics.Histogram(
+    'password_hash_duration_seconds', 'Time spent hashing or verifying a password.',
+    ('operation',)))
+hash_wait = metrics.registry.register(metrics.Histogram(
+    'password_hash_queue_wait_seconds', 'Time a hash waited for a pool worker.'))
+hash_rejections = metrics.registry.register(metrics.Counter(
+    'password_hash_rejections_total', 'Hashes refused because the pool was full or slow.',
+    ('reason',)))
+hash_queue_depth = metrics.registry.register(metrics.Gauge(
+    'password_hash_pending', 'Hashes running or queued in this process.'))
+
+
+class HashingBusy(Exception):
+    """The hashing pool is saturated; the caller should retry later."""
+
+
+def hash_password_now(password):
+    """Hash ``password`` with the configured scheme on the calling thread."""
+    if PASSWORD_SCHEME == 'bcrypt':
+        # bcrypt only looks at the first 72 bytes of the password
+        return bcrypt.hashpw(password.encode(), bcrypt.gensalt(BCRYPT_ROUNDS)).decode()
+    return generate_password_hash(password, method=PASSWORD_METHOD)
+
+
+def verify_password_now(stored, password):
+    if not stored or password is None:
+        return False
+    if _BCRYPT_HASH.match(stored):
+        return bcrypt.checkpw(password.encode(), stored.encode())
+    return check_password_hash(stored, password)
+
+
+@lru_cache(maxsize=None)
+def werkzeug_method():
+    """The method prefix Werkzeug writes for ``PASSWORD_METHOD``.
+
+    Werkzeug stores ``method$salt$hash`` with the cost parameters filled
+    in (``scrypt`` becomes ``scrypt:32768:8:1``), so the prefix is taken
+    from one real hash rather than from the setting.
+    """
+    return generate_password_hash('', method=PASSWORD_METHOD).split('$', 1)[0]
+
+
+def needs_rehash(stored):
+    """True if ``stored`` was made with a different scheme or cost than configured."""
+    match = _BCRYPT_HASH.match(stored or '')
+    if PASSWORD_SCHEME == 'bcrypt':
+        return match is None or int(match.group(1)) != BCRYPT_ROUNDS
+    return match is not None or (stored or '').split('$', 1)[0] != werkzeug_method()
+
+
+class HashingPool:
+    def __init__(self, workers=HASH_WORKERS, queue_limit=HASH_QUEUE_LIMIT, timeout=HASH_TIMEOUT):
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(workers + queue_limit)
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+
+    def _get_executor(self):
+        # A forked worker inherits no threads; give each process its own pool
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                    thread_name_prefix='password-hash')
+                self._pid = os.getpid()
+            return self._executor
+
+    def _adjust_pending(self, delta):
+        with self._lock:
+            self._pending += delta
+            hash_queue_depth.set(value=self._pending)
+
+    def run(self, operation, function, *args):
+        if not self._slots.acquire(blocking=False):
+            hash_rejections.inc('queue_full')
+            raise HashingBusy()
+        self._adjust_pending(1)
+        submitted = time.perf_counter()
+
+        def task():
+            started = time.perf_counter()
+            hash_wait.observe(value=started - submitted)
+            try:
+                return function(*args)
+            finally:
+                hash_duration.observe(operation, value=time.perf_counter() - started)
+                self._adjust_pending(-1)
+                self._slots.release()
+
+        future = self._get_executor().submit(task)
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            # The hash still completes in the background and frees its slot
+            hash_rejections.inc('timeout')
+            raise HashingBusy()
+
+
+pool = HashingPool()
+
+
+def hash_password(password):
+    return pool.run('hash', hash_password_now, password)
+
+
+def verify_password(stored, password):
+    return pool.run('verify', verify_password_now, stored, password)
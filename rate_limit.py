@@ -0,0 +1,60 @@
+"""Token-bucket rate limiting for the login and signup forms.
+
+Each key (client IP or email address) gets a bucket of ``burst`` tokens
+refilled at ``rate`` per second. Requests over the limit are refused
+before the user lookup and before any password hashing, so a credential
+stuffing burst costs almost nothing. Buckets live in process memory and
+idle ones expire, so each worker process enforces its own limit.
+"""
+
+import os
+import threading
+import time
+
+from cache import TTLCache
+import metrics
+
+rate_limited = metrics.registry.register(metrics.Counter(
+    'rate_limited_requests_total', 'Requests refused by a rate limiter.', ('limiter',)))
+
+
+class TokenBucketLimiter:
+    def __init__(self, name, rate, burst, maxsize=10000):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        # An idle bucket is full again after burst / rate seconds; drop it then
+        self._buckets = TTLCache(maxsize=maxsize, ttl=burst / rate if rate else 3600)
+        self._lock = threading.Lock()
+
+    def hit(self, key):
+        """Take a token for ``key``; returns 0 if allowed, else seconds to wait."""
+        if self.rate <= 0 or not key:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= 1:
+                self._buckets.set(key, (tokens - 1, now))
+                return 0
+            self._buckets.set(key, (tokens, now))
+        rate_limited.inc(self.name)
+        return (1 - tokens) / self.rate
+
+
+# Rates are requests per second; 0 disables the limiter. A whole class
+# behind one school NAT logs in at once from a single address, so the IP
+# bucket is sized well above a class; the email bucket is the tight one.
+login_ip_limiter = TokenBucketLimiter(
+    'login_ip', float(os.getenv('LOGIN_IP_RATE', '2')), int(os.getenv('LOGIN_IP_BURST', '200')))
+login_email_limiter = TokenBucketLimiter(
+    'login_email', float(os.getenv('LOGIN_EMAIL_RATE', '0.1')), int(os.getenv('LOGIN_EMAIL_BURST', '5')))
+
+
+def check_login(ip, email=None):
+    """Seconds the client must wait before another attempt (0 if allowed)."""
+    wait = login_ip_limiter.hit(ip)
+    if not wait and email:
+        wait = login_email_limiter.hit(email.strip().lower())
+    return wait
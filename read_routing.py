@@ -0,0 +1,107 @@
+"""Route reads to replica-set members by workload.
+
+Every read is tagged with a workload:
+- ``interactive``: page and API reads;
+- ``export``: downloads;
+- ``analytics``: the diary calendar and group roll-ups;
+- ``search``: diary and archive search.
+
+Each workload gets its own read preference (``READ_PREFERENCE_<WORKLOAD>``).
+The heavy read-only traffic can then run on secondaries, away from the
+writes on the primary. Non-primary modes carry ``maxStalenessSeconds``
+(``READ_MAX_STALENESS_SECONDS``), so a lagging secondary is not used.
+
+Read-your-own-writes: a request that changes data marks the user's
+session. For ``READ_YOUR_WRITES_SECONDS`` afterwards every read for that
+user goes to the primary. The redirect page after a save or delete
+therefore always shows the change. Work handed to other threads (see
+fanout.py) must ``resolve()`` its workload in the request thread first.
+
+On a standalone server or with the defaults, everything reads from the
+primary, as before.
+"""
+
+import os
+import time
+
+from flask import has_request_context, session
+from pymongo.read_preferences import (Nearest, Primary, PrimaryPreferred, Secondary,
+                                      SecondaryPreferred)
+
+import metrics
+
+WORKLOADS = ('interactive', 'export', 'analytics', 'search')
+MODES = {
+    'primary': Primary,
+    'primaryPreferred': PrimaryPreferred,
+    'secondary': Secondary,
+    'secondaryPreferred': SecondaryPreferred,
+    'nearest': Nearest,
+}
+
+# The server rejects bounds under 90 seconds; -1 means no bound
+READ_MAX_STALENESS_SECONDS = int(os.getenv('READ_MAX_STALENESS_SECONDS', '90'))
+# Long enough for a secondary within the staleness bound to have caught up
+READ_YOUR_WRITES_SECONDS = float(os.getenv(
+    'READ_YOUR_WRITES_SECONDS', str(max(READ_MAX_STALENESS_SECONDS, 90))))
+
+_SESSION_KEY = 'read_primary_until'
+# Pseudo-workload for reads pinned to the primary after the user's own write
+OWN_WRITES = 'own_writes'
+
+reads_routed = metrics.registry.register(metrics.Counter(
+    'mongodb_reads_routed_total', 'Reads by workload and the read preference used.',
+    ('workload', 'mode')))
+
+
+def _read_preference(mode):
+    if mode not in MODES:
+        raise ValueError(f'unknown read preference {mode!r}; expected one of {", ".join(MODES)}')
+    if mode == 'primary':
+        return Primary()
+    return MODES[mode](max_staleness=READ_MAX_STALENESS_SECONDS)
+
+
+def _configured_modes(environ=None):
+    environ = os.environ if environ is None else environ
+    defaults = {'interactive': 'primary', 'export': 'secondaryPreferred',
+                'analytics': 'secondaryPreferred', 'search': 'secondaryPreferred'}
+    return {workload: environ.get(f'READ_PREFERENCE_{workload.upper()}', default)
+            for workload, default in defaults.items()}
+
+
+MODES_BY_WORKLOAD = _configured_modes()
+READ_PREFERENCES = {workload: _read_preference(mode) for workload, mode in MODES_BY_WORKLOAD.items()}
+READ_PREFERENCES[OWN_WRITES] = Primary()
+
+
+def note_write():
+    """Pin this user's reads to the primary for the read-your-writes window."""
+    session[_SESSION_KEY] = time.time() + READ_YOUR_WRITES_SECONDS
+
+
+def own_write_pending():
+    """Whether the current user changed data within the read-your-writes window."""
+    return has_request_context() and session.get(_SESSION_KEY, 0) > time.time()
+
+
+def resolve(workload):
+    """The workload to read with: OWN_WRITES (the primary) just after the user's own write."""
+    if workload not in READ_PREFERENCES:
+        raise ValueError(f'unknown workload {workload!r}')
+    if own_write_pending():
+        return OWN_WRITES
+    return workload
+
+
+def reads_primary(workload):
+    """Whether ``workload`` (as resolved now) can only be served by the primary."""
+    return READ_PREFERENCES[resolve(workload)].mongos_mode == 'primary'
+
+
+def collection(db, name, workload):
+    """``db[name]`` with the read preference of ``workload``."""
+    workload = resolve(workload)
+    read_preference = READ_PREFERENCES[workload]
+    reads_routed.inc(workload, read_preference.mongos_mode)
+    return db[name].with_options(read_preference=read_preference)
@@ -0,0 +1,190 @@
+"""Overdue flags and due-date reminders for tasks.
+
+Each task carries an ``overdue`` flag. Task writes keep it right for the
+task they touch (``is_overdue()`` / ``refresh_flags()``). The only other
+way a task becomes overdue is the calendar moving on, which
+``sweep_overdue()`` handles. It walks the ``(status, due_date, _id)``
+index over the pending tasks that fell due since its previous run,
+in bounded batches. The overdue list and the dashboard count are then
+plain indexed lookups on the flag.
+
+``sweep_reminders()`` walks the same index over pending tasks due within
+``REMINDER_DAYS``. It hands each one, once per due date, to the
+configured notifier. Both sweeps run from the scheduler (scheduler.py).
+"""
+
+import importlib
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+
+from pymongo import UpdateOne
+
+from dates import today, utcnow
+import data_version
+import metrics
+
+logger = logging.getLogger(__name__)
+
+SWEEP_BATCH_SIZE = int(os.getenv('SWEEP_BATCH_SIZE', '500'))
+SWEEP_PAUSE = float(os.getenv('SWEEP_PAUSE', '0.1'))
+# Remind about pending tasks due today or within this many days
+REMINDER_DAYS = int(os.getenv('REMINDER_DAYS', '1'))
+# 'queue' (the notifications collection), 'log', or 'module:function'
+REMINDER_NOTIFIER = os.getenv('REMINDER_NOTIFIER', 'queue')
+
+NOTIFICATIONS_COLLECTION = 'notifications'
+STATE_COLLECTION = 'sweep_state'
+
+tasks_flagged = metrics.registry.register(metrics.Counter(
+    'tasks_marked_overdue_total', 'Tasks flagged overdue by the sweep.'))
+reminders_sent = metrics.registry.register(metrics.Counter(
+    'task_reminders_total', 'Due-date reminders by outcome.', ('outcome',)))
+
+
+def is_overdue(status, due_date, day=None):
+    return status == 'pending' and isinstance(due_date, datetime) and due_date < (day or today())
+
+
+def overdue_expression(status, day=None):
+    """is_overdue() as an aggregation expression over the stored ``due_date``.
+
+    For update pipelines that set ``status`` and ``overdue`` in one write.
+    BSON orders every string, number and null before every date, so the
+    lower bound also leaves out legacy string due dates.
+    """
+    if status != 'pending':
+        return False
+    return {'$and': [{'$gte': ['$due_date', datetime(1970, 1, 1)]},
+                     {'$lt': ['$due_date', day or today()]}]}
+
+
+def refresh_flags(collection, query, day=None):
+    """Recompute ``overdue`` for the tasks matching ``query`` (e.g. after a bulk update)."""
+    day = day or today()
+    due = {'status': 'pending', 'due_date': {'$lt': day}}
+    collection.update_many({'$and': [query, due, {'overdue': {'$ne': True}}]},
+                           {'$set': {'overdue': True}})
+    collection.update_many({'$and': [query, {'overdue': True}, {'$nor': [due]}]},
+                           {'$set': {'overdue': False}})
+
+
+def scan(collection, query, projection, batch_size=SWEEP_BATCH_SIZE):
+    """Yield batches matching ``query`` in (due_date, _id) order, resuming by key.
+
+    Each batch is a fresh, short query, so no cursor stays open across the
+    writes and pauses between batches.
+    """
+    last = None
+    while True:
+        page_query = query
+        if last is not None:
+            page_query = {'$and': [query, {'$or': [
+                {'due_date': {'$gt': last['due_date']}},
+                {'due_date': last['due_date'], '_id': {'$gt': last['_id']}},
+            ]}]}
+        batch = list(collection.find(page_query, projection)
+                     .sort([('due_date', 1), ('_id', 1)]).limit(batch_size))
+        if not batch:
+            return
+        yield batch
+        if len(batch) < batch_size:
+            return
+        last = batch[-1]
+
+
+def _bump_versions(db, tasks):
+    # Cached dashboard panels and ETags must not outlive the change
+    for user_id in {task['user_id'] for task in tasks}:
+        data_version.bump(db, user_id)
+
+
+def sweep_overdue(db, batch_size=SWEEP_BATCH_SIZE, pause=SWEEP_PAUSE):
+    """Flag pending tasks whose due date has passed; returns the number flagged."""
+    day = today()
+    state = db[STATE_COLLECTION].find_one({'_id': 'overdue'}) or {}
+    due_date = {'$lt': day}
+    if state.get('through'):
+        # Earlier due dates were flagged by previous sweeps or at write time;
+        # re-check one day back in case a sweep died midway
+        due_date['$gte'] = state['through'] - timedelta(days=1)
+    tasks = db['tasks']
+    flagged = 0
+    for batch in scan(tasks, {'status': 'pending', 'due_date': due_date},
+                      {'user_id': 1, 'due_date': 1, 'overdue': 1}, batch_size):
+        stale = [task for task in batch if not task.get('overdue')]
+        if stale:
+            result = tasks.update_many({'_id': {'$in': [task['_id'] for task in stale]},
+                                        'status': 'pending'}, {'$set': {'overdue': True}})
+            flagged += result.modified_count
+            _bump_versions(db, stale)
+        if pause:
+            time.sleep(pause)
+    db[STATE_COLLECTION].replace_one({'_id': 'overdue'}, {'_id': 'overdue', 'through': day},
+                                     upsert=True)
+    tasks_flagged.inc(amount=flagged)
+    return flagged
+
+
+def reset_overdue_sweep(db):
+    """Make the next overdue sweep scan every past due date again."""
+    db[STATE_COLLECTION].delete_one({'_id': 'overdue'})
+
+
+def queue_notifier(db, task):
+    """Queue an in-app reminder in the notifications collection."""
+    db[NOTIFICATIONS_COLLECTION].update_one(
+        {'task_id': task['_id'], 'kind': 'due_soon', 'due_date': task['due_date']},
+        {'$setOnInsert': {'user_id': task['user_id'], 'name': task.get('name'),
+                          'created_at': utcnow(), 'read': False}},
+        upsert=True)
+
+
+def log_notifier(db, task):
+    logger.info('Reminder: task %s (%s) for user %s is due %s', task['_id'], task.get('name'),
+                task['user_id'], task['due_date'].date())
+
+
+NOTIFIERS = {'queue': queue_notifier, 'log': log_notifier}
+
+
+def load_notifier(spec=REMINDER_NOTIFIER):
+    """The notifier named by ``spec``: a built-in name or 'module:function'."""
+    if spec in NOTIFIERS:
+        return NOTIFIERS[spec]
+    module_name, _, function_name = spec.partition(':')
+    if not function_name:
+        raise ValueError(f'unknown notifier {spec!r}')
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def sweep_reminders(db, notify=None, batch_size=SWEEP_BATCH_SIZE, pause=SWEEP_PAUSE):
+    """Notify once per due date about pending tasks due soon; returns the number sent."""
+    notify = notify or load_notifier()
+    day = today()
+    tasks = db['tasks']
+    sent = 0
+    query = {'status': 'pending',
+             'due_date': {'$gte': day, '$lt': day + timedelta(days=REMINDER_DAYS + 1)}}
+    for batch in scan(tasks, query, {'user_id': 1, 'name': 1, 'due_date': 1, 'reminded_for': 1},
+                      batch_size):
+        done = []
+        for task in batch:
+            if task.get('reminded_for') == task['due_date']:
+                continue
+            try:
+                notify(db, task)
+            except Exception:
+                # Not marked, so the next sweep tries again
+                logger.exception('Reminder for task %s failed', task['_id'])
+                reminders_sent.inc('error')
+                continue
+            reminders_sent.inc('sent')
+            done.append(UpdateOne({'_id': task['_id']}, {'$set': {'reminded_for': task['due_date']}}))
+        if done:
+            tasks.bulk_write(done, ordered=False)
+            sent += len(done)
+        if pause:
+            time.sleep(pause)
+    return sent
@@ -0,0 +1,296 @@
+"""Incremental roll-ups behind the group dashboards.
+
+Two levels of pre-aggregated data:
+
+``daily_rollups``
+    One document per (user, day), holding tasks due that day (total,
+    completed, pending) and diary entries/words written that day. Each run
+    re-aggregates only the days touched since the last run: the days of
+    documents with a newer ``updated_at``, plus the old days that deletes
+    and date changes recorded (``record_changed_days``). ``$merge``
+    replaces each day's document whole, and days left with nothing are
+    deleted afterwards. Archived documents are included, like in stats.py.
+
+``group_rollups``
+    One document per group: per-member completion rate, overdue count and
+    recent diary activity, plus group totals and a daily series. It is
+    rebuilt from the small daily documents when a member changed, the
+    membership changed, or the day rolled over (overdue counts depend on
+    today's date).
+
+A group dashboard is therefore a single ``find_one``. Run the job
+periodically with ``flask rollup``; the figures are as fresh as its
+schedule.
+"""
+
+import logging
+import os
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+from dates import day_range, today, utcnow
+from groups import GROUPS_COLLECTION, GROUP_ROLLUPS_COLLECTION
+from sync import SYNC_SETTLE_SECONDS
+import read_routing
+
+logger = logging.getLogger(__name__)
+
+DAILY_ROLLUPS_COLLECTION = 'daily_rollups'
+STATE_COLLECTION = 'rollup_state'
+# Days a delete or date change left behind (see record_changed_days)
+DIRTY_DAYS_COLLECTION = 'rollup_dirty_days'
+ROLLUP_ACTIVITY_DAYS = int(os.getenv('ROLLUP_ACTIVITY_DAYS', '30'))
+# Users re-aggregated per $merge round
+ROLLUP_BATCH_SIZE = int(os.getenv('ROLLUP_BATCH_SIZE', '200'))
+
+DAY_FORMAT = '%Y-%m-%d'
+
+
+def _day_key(field):
+    return {'$dateToString': {'format': DAY_FORMAT, 'date': field}}
+
+
+def day_key(date):
+    return date.strftime(DAY_FORMAT) if isinstance(date, datetime) else None
+
+
+def _task_rows(match):
+    return [
+        {'$match': match},
+        {'$project': {
+            '_id': 0, 'user_id': 1, 'day': _day_key('$due_date'),
+            'tasks_due': {'$literal': 1},
+            'tasks_completed': {'$cond': [{'$eq': ['$status', 'completed']}, 1, 0]},
+            'tasks_pending': {'$cond': [{'$eq': ['$status', 'pending']}, 1, 0]},
+        }},
+    ]
+
+
+def _diary_rows(match):
+    return [
+        {'$match': match},
+        {'$project': {
+            '_id': 0, 'user_id': 1, 'day': _day_key('$date'),
+            'diary_entries': {'$literal': 1},
+            'diary_words': {'$ifNull': ['$word_count', 0]},
+        }},
+    ]
+
+
+def daily_rollup_pipeline(task_match, diary_match, computed_at):
+    """Complete (user, day) documents from all four collections, replacing the stored ones.
+
+    Run on the ``tasks`` collection. Legacy string dates left by
+    migrate-dates have no day and are left out by the callers' matches.
+    """
+    return _task_rows(task_match) + [
+        {'$unionWith': {'coll': 'tasks_archive', 'pipeline': _task_rows(task_match)}},
+        {'$unionWith': {'coll': 'diary', 'pipeline': _diary_rows(diary_match)}},
+        {'$unionWith': {'coll': 'diary_archive', 'pipeline': _diary_rows(diary_match)}},
+        {'$group': {
+            '_id': {'user_id': '$user_id', 'day': '$day'},
+            'tasks_due': {'$sum': '$tasks_due'},
+            'tasks_completed': {'$sum': '$tasks_completed'},
+            'tasks_pending': {'$sum': '$tasks_pending'},
+            'diary_entries': {'$sum': '$diary_entries'},
+            'diary_words': {'$sum': '$diary_words'},
+        }},
+        {'$set': {'user_id': '$_id.user_id', 'day': '$_id.day', 'computed_at': computed_at}},
+        # Each document is written whole, so readers never see a half-built day
+        {'$merge': {'into': DAILY_ROLLUPS_COLLECTION, 'on': '_id',
+                    'whenMatched': 'replace', 'whenNotMatched': 'insert'}},
+    ]
+
+
+def record_changed_days(db, user_id, dates):
+    """Mark days to re-aggregate that no changed document points to any more.
+
+    Call it with the old date when a task or diary entry is deleted or
+    moved to another day. Days that still hold a changed document are
+    found from ``updated_at`` and need no marker.
+    """
+    now = utcnow()
+    markers = [{'user_id': user_id, 'day': key, 'marked_at': now}
+               for key in {day_key(date) for date in dates} if key]
+    if markers:
+        db[DIRTY_DAYS_COLLECTION].insert_many(markers, ordered=False)
+
+
+def changed_days(db, since):
+    """{user_id: {day, ...}} touched at or after ``since``, and the markers read."""
+    days = {}
+    for name, field in (('tasks', 'due_date'), ('diary', 'date')):
+        for row in db[name].aggregate([
+            {'$match': {'updated_at': {'$gte': since}, field: {'$type': 'date'}}},
+            {'$group': {'_id': {'user_id': '$user_id', 'day': _day_key('$' + field)}}},
+        ]):
+            days.setdefault(row['_id']['user_id'], set()).add(row['_id']['day'])
+    markers = list(db[DIRTY_DAYS_COLLECTION].find({}, {'user_id': 1, 'day': 1}))
+    for marker in markers:
+        days.setdefault(marker['user_id'], set()).add(marker['day'])
+    days.pop(None, None)
+    return days, [marker['_id'] for marker in markers]
+
+
+def all_users(db):
+    """Every user with tasks or diary entries, live or archived."""
+    users = set()
+    for name in ('tasks', 'diary', 'tasks_archive', 'diary_archive'):
+        users.update(db[name].distinct('user_id'))
+    return sorted(user for user in users if user)
+
+
+def _stamp(when):
+    # BSON dates keep milliseconds; computed_at is compared after the round trip
+    return when.replace(microsecond=when.microsecond // 1000 * 1000)
+
+
+def refresh_daily(db, user_ids, computed_at=None):
+    """Rebuild every daily document of ``user_ids``."""
+    computed_at = _stamp(computed_at or utcnow())
+    for start in range(0, len(user_ids), ROLLUP_BATCH_SIZE):
+        batch = user_ids[start:start + ROLLUP_BATCH_SIZE]
+        db['tasks'].aggregate(daily_rollup_pipeline(
+            {'user_id': {'$in': batch}, 'due_date': {'$type': 'date'}},
+            {'user_id': {'$in': batch}, 'date': {'$type': 'date'}}, computed_at))
+        # Days this run did not write no longer have any tasks or entries
+        db[DAILY_ROLLUPS_COLLECTION].delete_many(
+            {'user_id': {'$in': batch}, 'computed_at': {'$ne': computed_at}})
+
+
+def refresh_days(db, days, computed_at=None):
+    """Rebuild only the given days: ``days`` maps user ids to sets of day keys."""
+    computed_at = _stamp(computed_at or utcnow())
+    keys = [(user_id, day) for user_id in sorted(days) for day in sorted(days[user_id])]
+    for start in range(0, len(keys), ROLLUP_BATCH_SIZE):
+        batch = keys[start:start + ROLLUP_BATCH_SIZE]
+        ranges = [(user_id, datetime.strptime(day, DAY_FORMAT)) for user_id, day in batch]
+        task_match = {'$or': [{'user_id': user_id, 'due_date': day_range(day)} for user_id, day in ranges]}
+        diary_match = {'$or': [{'user_id': user_id, 'date': day_range(day)} for user_id, day in ranges]}
+        db['tasks'].aggregate(daily_rollup_pipeline(task_match, diary_match, computed_at))
+        db[DAILY_ROLLUPS_COLLECTION].delete_many({
+            '_id': {'$in': [{'user_id': user_id, 'day': day} for user_id, day in batch]},
+            'computed_at': {'$ne': computed_at},
+        })
+
+
+def _rate(completed, total):
+    return round(100 * completed / total) if total else None
+
+
+def refresh_group(db, group, computed_at=None):
+    """Rebuild the roll-up document of one group from the daily documents."""
+    computed_at = computed_at or utcnow()
+    today_key = today().strftime(DAY_FORMAT)
+    since_key = (today() - timedelta(days=ROLLUP_ACTIVITY_DAYS - 1)).strftime(DAY_FORMAT)
+    member_ids = list(group.get('member_ids', []))
+
+    past_due = {'$and': [{'$ne': ['$day', None]}, {'$lt': ['$day', today_key]}]}
+    recent = {'$gte': ['$day', since_key]}
+    facets = next(db[DAILY_ROLLUPS_COLLECTION].aggregate([
+        {'$match': {'user_id': {'$in': member_ids}}},
+        {'$facet': {
+            'members': [{'$group': {
+                '_id': '$user_id',
+                'tasks_total': {'$sum': '$tasks_due'},
+                'tasks_completed': {'$sum': '$tasks_completed'},
+                'overdue': {'$sum': {'$cond': [past_due, '$tasks_pending', 0]}},
+                'diary_entries': {'$sum': {'$cond': [recent, '$diary_entries', 0]}},
+            }}],
+            'days': [
+                {'$match': {'day': {'$gte': since_key, '$lte': today_key}}},
+                {'$group': {'_id': '$day',
+                            'diary_entries': {'$sum': '$diary_entries'},
+                            'tasks_completed': {'$sum': '$tasks_completed'}}},
+                {'$sort': {'_id': 1}},
+            ],
+        }},
+    ]))
+
+    object_ids = []
+    for member_id in member_ids:
+        try:
+            object_ids.append(ObjectId(member_id))
+        except InvalidId:
+            pass
+    emails = {str(user['_id']): user.get('email')
+              for user in db['users'].find({'_id': {'$in': object_ids}}, {'email': 1})}
+
+    by_member = {row['_id']: row for row in facets['members']}
+    members = []
+    totals = {'tasks_total': 0, 'tasks_completed': 0, 'overdue': 0, 'diary_entries': 0}
+    for member_id in member_ids:
+        row = by_member.get(member_id, {})
+        member = {'user_id': member_id, 'email': emails.get(member_id)}
+        for key in totals:
+            member[key] = row.get(key, 0)
+            totals[key] += member[key]
+        member['completion_rate'] = _rate(member['tasks_completed'], member['tasks_total'])
+        members.append(member)
+    members.sort(key=lambda member: member['email'] or '')
+    totals['members'] = len(members)
+    totals['completion_rate'] = _rate(totals['tasks_completed'], totals['tasks_total'])
+
+    rollup = {
+        '_id': group['_id'],
+        'day': today_key,
+        'computed_at': computed_at,
+        'activity_days': ROLLUP_ACTIVITY_DAYS,
+        'totals': totals,
+        'members': members,
+        'days': [{'day': row['_id'], 'diary_entries': row['diary_entries'],
+                  'tasks_completed': row['tasks_completed']} for row in facets['days']],
+    }
+    db[GROUP_ROLLUPS_COLLECTION].replace_one({'_id': group['_id']}, rollup, upsert=True)
+    return rollup
+
+
+def run_rollups(db, full=False):
+    """Bring the daily and group roll-ups up to date; returns counts of what was rebuilt."""
+    state = None if full else db[STATE_COLLECTION].find_one({'_id': 'rollups'})
+    run_at = utcnow()
+    if state is None:
+        users = all_users(db)
+        refresh_daily(db, users, run_at)
+        db[DIRTY_DAYS_COLLECTION].delete_many({'marked_at': {'$lte': run_at}})
+        since = None
+    else:
+        # Overlap by the settle window: updated_at is stamped before the write lands
+        since = state['synced_to'] - timedelta(seconds=SYNC_SETTLE_SECONDS)
+        days, markers = changed_days(db, since)
+        refresh_days(db, days, run_at)
+        # Only the markers that were read: newer ones wait for the next run
+        db[DIRTY_DAYS_COLLECTION].delete_many({'_id': {'$in': markers}})
+        users = sorted(days)
+
+    today_key = today().strftime(DAY_FORMAT)
+    if since is None:
+        group_query = {}
+    else:
+        stale = db[GROUP_ROLLUPS_COLLECTION].distinct('_id', {'day': {'$ne': today_key}})
+        group_query = {'$or': [{'member_ids': {'$in': users}},
+                               {'updated_at': {'$gte': since}},
+                               {'_id': {'$in': stale}}]}
+    groups = list(db[GROUPS_COLLECTION].find(group_query, {'member_ids': 1}))
+    for group in groups:
+        refresh_group(db, group, run_at)
+
+    db[STATE_COLLECTION].replace_one({'_id': 'rollups'}, {'_id': 'rollups', 'synced_to': run_at},
+                                     upsert=True)
+    logger.info('rollups: %d users, %d groups rebuilt', len(users), len(groups))
+    return {'users': len(users), 'groups': len(groups)}
+
+
+def get_group_rollup(db, group, workload='interactive'):
+    """The group's roll-up document, built on the spot the first time."""
+    rollup = read_routing.collection(db, GROUP_ROLLUPS_COLLECTION, workload).find_one(
+        {'_id': group['_id']})
+    rolled_up = {member['user_id'] for member in rollup['members']} if rollup else set()
+    if rollup is None or rolled_up != set(group['member_ids']):
+        # New group or membership changed since the last run; members who
+        # just joined may have no daily documents yet
+        refresh_daily(db, sorted(set(group['member_ids']) - rolled_up))
+        rollup = refresh_group(db, group)
+    return rollup
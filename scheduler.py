@@ -0,0 +1,108 @@
+"""A small periodic job runner, safe to start in every worker process.
+
+Each job has an interval. Its next run time lives in the ``scheduler``
+collection, and a process claims a run by advancing that time with one
+conditional update. However many processes run the scheduler, each run
+of a job therefore happens in exactly one of them. Durations and outcomes
+are kept on the job's document and exported as metrics.
+
+Run it inside the web workers (``SCHEDULER_ENABLED``) or on its own with
+``flask scheduler``.
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import timedelta
+
+from pymongo.errors import DuplicateKeyError
+
+from dates import utcnow
+import metrics
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_COLLECTION = 'scheduler'
+# How often the loop checks for due jobs
+SCHEDULER_TICK = float(os.getenv('SCHEDULER_TICK', '10'))
+
+job_duration = metrics.registry.register(metrics.Histogram(
+    'scheduler_job_duration_seconds', 'Duration of scheduled job runs.', ('job',),
+    buckets=(0.1, 0.5, 1, 5, 15, 60, 300, 900)))
+job_runs = metrics.registry.register(metrics.Counter(
+    'scheduler_job_runs_total', 'Scheduled job runs by outcome.', ('job', 'outcome')))
+
+
+class Job:
+    def __init__(self, name, interval, function):
+        self.name = name
+        self.interval = interval
+        self.function = function
+
+
+class Scheduler:
+    def __init__(self, get_db, jobs=(), tick=SCHEDULER_TICK):
+        self.get_db = get_db
+        self.jobs = [job for job in jobs if job.interval > 0]
+        self.tick = tick
+        self._stop = threading.Event()
+        self._thread = None
+
+    def claim(self, db, job, now):
+        """Take the job's current run if it is due; False if not due or taken."""
+        try:
+            # Upserts on the very first run; a job document that is not due
+            # makes the upsert collide on _id instead
+            db[SCHEDULER_COLLECTION].find_one_and_update(
+                {'_id': job.name, 'next_run': {'$lte': now}},
+                {'$set': {'next_run': now + timedelta(seconds=job.interval),
+                          'owner': f'{socket.gethostname()}:{os.getpid()}', 'started_at': now}},
+                upsert=True)
+        except DuplicateKeyError:
+            return False
+        return True
+
+    def run_job(self, db, job):
+        started = time.perf_counter()
+        try:
+            result = job.function(db)
+            outcome, error = 'ok', None
+        except Exception as e:
+            logger.exception('Scheduled job %s failed', job.name)
+            result, outcome, error = None, 'error', str(e)
+        duration = time.perf_counter() - started
+        job_duration.observe(job.name, value=duration)
+        job_runs.inc(job.name, outcome)
+        db[SCHEDULER_COLLECTION].update_one({'_id': job.name}, {'$set': {
+            'finished_at': utcnow(), 'duration': duration, 'outcome': outcome,
+            'result': result, 'error': error,
+        }})
+        logger.info('Job %s: %s in %.2fs (%r)', job.name, outcome, duration, result)
+        return result
+
+    def run_pending(self):
+        db = self.get_db()
+        for job in self.jobs:
+            if self._stop.is_set():
+                return
+            if self.claim(db, job, utcnow()):
+                self.run_job(db, job)
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            try:
+                self.run_pending()
+            except Exception:
+                logger.exception('Scheduler tick failed')
+            self._stop.wait(self.tick)
+
+    def start(self):
+        """Run in a daemon thread of the current process (once)."""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self.run_forever, name='scheduler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
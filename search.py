@@ -0,0 +1,106 @@
+"""Diary full-text search backed by the (user_id, text) index.
+
+User input is reduced to plain word tokens before it reaches MongoDB, so
+it is never interpreted as a regular expression. Results are ranked by
+text score and paged by offset, because relevance order has no stable
+key to seek on; the per-user index prefix keeps each page bounded by the
+user's own matches.
+"""
+
+import re
+
+from markupsafe import Markup, escape
+
+from pagination import Page, PAGE_SIZE, encode_token, decode_token
+
+MAX_QUERY_TERMS = 16
+MAX_TERM_LENGTH = 64
+MIN_TERM_LENGTH = 2
+SNIPPET_LENGTH = 240
+
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(query):
+    terms = []
+    for term in _TOKEN.findall(query.lower()):
+        term = term[:MAX_TERM_LENGTH]
+        if len(term) >= MIN_TERM_LENGTH and term not in terms:
+            terms.append(term)
+    return terms[:MAX_QUERY_TERMS]
+
+
+def _term_pattern(terms):
+    # The text index stems words, so "running" matches "run"; mirror that
+    # loosely by highlighting any word that starts with a query term.
+    alternatives = '|'.join(re.escape(term) for term in sorted(terms, key=len, reverse=True))
+    return re.compile(rf'\b(?:{alternatives})\w*', re.IGNORECASE | re.UNICODE)
+
+
+def highlight(text, terms, length=None):
+    """Return ``text`` HTML-escaped with matches wrapped in <mark>.
+
+    With ``length`` set, only a window of about that many characters
+    around the first match is kept.
+    """
+    text = text or ''
+    if not terms:
+        return escape(text[:length] if length else text)
+    pattern = _term_pattern(terms)
+
+    if length and len(text) > length:
+        match = pattern.search(text)
+        start = max(0, match.start() - length // 3) if match else 0
+        end = start + length
+        window = text[start:end]
+        prefix = '…' if start > 0 else ''
+        suffix = '…' if end < len(text) else ''
+    else:
+        window, prefix, suffix = text, '', ''
+
+    parts = []
+    position = 0
+    for match in pattern.finditer(window):
+        parts.append(escape(window[position:match.start()]))
+        parts.append(Markup('<mark>%s</mark>') % match.group(0))
+        position = match.end()
+    parts.append(escape(window[position:]))
+    return Markup(prefix) + Markup('').join(parts) + Markup(suffix)
+
+
+def _decode_offset(token):
+    if not token:
+        return 0
+    try:
+        offset = decode_token(token)
+    except ValueError:
+        return 0
+    return offset if isinstance(offset, int) and offset > 0 else 0
+
+
+def search_entries(collection, user_id, query, after=None, before=None,
+                   page_size=PAGE_SIZE, projection=None):
+    """Return (Page, terms) of the user's diary entries ranked by relevance."""
+    terms = tokenize(query)
+    if not terms:
+        return Page([]), terms
+
+    offset = _decode_offset(after) if after else _decode_offset(before)
+    fields = dict(projection or {})
+    fields['score'] = {'$meta': 'textScore'}
+    cursor = collection.find(
+        {'user_id': user_id, '$text': {'$search': ' '.join(terms)}},
+        fields
+    ).sort([('score', {'$meta': 'textScore'})]).skip(offset).limit(page_size + 1)
+
+    items = list(cursor)
+    has_more = len(items) > page_size
+    items = items[:page_size]
+    for item in items:
+        item['title_html'] = highlight(item.get('title'), terms)
+        # Listings project the stored excerpt rather than the whole body
+        item['snippet'] = highlight(item.get('excerpt', item.get('entry')), terms, SNIPPET_LENGTH)
+
+    next_cursor = encode_token(offset + page_size) if has_more else None
+    prev_cursor = encode_token(max(0, offset - page_size)) if offset else None
+    return Page(items, next_cursor, prev_cursor), terms
@@ -0,0 +1,17 @@
+// Full bodies are not part of the listing; fetch one when asked for
+document.querySelectorAll('.show-full-entry').forEach(function(link) {
+    link.addEventListener('click', function(event) {
+        event.preventDefault();
+        fetch(link.dataset.url, {headers: {'Accept': 'application/json'}})
+            .then(function(response) {
+                if (!response.ok) { throw new Error(response.status); }
+                return response.json();
+            })
+            .then(function(data) {
+                var entry = link.closest('.diary-entry');
+                entry.querySelector('.entry-body').textContent = data.entry || '';
+                link.parentNode.remove();
+            })
+            .catch(function() { window.location.href = link.href; });
+    });
+});
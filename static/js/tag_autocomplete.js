@@ -0,0 +1,32 @@
+// Suggest completions for the tag currently being typed in #tags
+(function () {
+    const input = document.getElementById('tags');
+    const list = document.getElementById('tag-suggestions');
+    if (!input || !list) {
+        return;
+    }
+    let pending = null;
+
+    input.addEventListener('input', () => {
+        clearTimeout(pending);
+        pending = setTimeout(async () => {
+            const parts = input.value.split(',');
+            const prefix = parts.pop().trim();
+            const head = parts.map(part => part.trim()).filter(Boolean);
+            const response = await fetch(list.dataset.url + '?prefix=' + encodeURIComponent(prefix));
+            if (!response.ok) {
+                return;
+            }
+            const suggestions = await response.json();
+            list.innerHTML = '';
+            suggestions
+                .filter(item => !head.includes(item.tag))
+                .forEach(item => {
+                    const option = document.createElement('option');
+                    option.value = head.concat(item.tag).join(', ');
+                    option.label = item.tag + ' (' + item.count + ')';
+                    list.appendChild(option);
+                });
+        }, 150);
+    });
+})();
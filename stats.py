@@ -0,0 +1,209 @@
+"""Per-user task and diary statistics.
+
+Counts live in one materialized document per user in the ``user_stats``
+collection. Writes keep it current with ``$inc``; when the document is
+missing it is rebuilt from two ``$facet`` aggregations (one per
+collection) instead of one ``count_documents`` call per number.
+Archived tasks and diary entries (see archive.py) still count.
+"""
+
+import re
+from datetime import datetime
+
+import fanout
+import read_routing
+
+STATS_COLLECTION = 'user_stats'
+
+_SAFE_KEY = re.compile(r'^[A-Za-z0-9_]+$')
+
+
+def status_key(status):
+    # Status values come from form input and end up in a field path, so
+    # anything that is not a plain identifier is bucketed as 'other'.
+    if status and _SAFE_KEY.match(status):
+        return status
+    return 'other'
+
+
+def month_key(date):
+    # Legacy strings that migrate-dates could not parse count in the totals
+    # but in no month
+    return date.strftime('%Y-%m') if isinstance(date, datetime) else None
+
+
+def _with_archive(archive_name, user_id):
+    return [
+        {'$match': {'user_id': user_id}},
+        {'$unionWith': {'coll': archive_name, 'pipeline': [{'$match': {'user_id': user_id}}]}},
+    ]
+
+
+def task_stats_pipeline(user_id):
+    return _with_archive('tasks_archive', user_id) + [
+        {'$facet': {
+            'total': [{'$count': 'count'}],
+            'by_status': [{'$group': {'_id': '$status', 'count': {'$sum': 1}}}],
+        }},
+    ]
+
+
+def diary_stats_pipeline(user_id):
+    # Same rule as month_key(): values that are not dates get no month
+    month = {'$cond': [
+        {'$eq': [{'$type': '$date'}, 'date']},
+        {'$dateToString': {'format': '%Y-%m', 'date': '$date'}},
+        None,
+    ]}
+    return _with_archive('diary_archive', user_id) + [
+        {'$facet': {
+            'total': [{'$count': 'count'}],
+            'by_month': [{'$group': {'_id': month, 'count': {'$sum': 1}}}],
+        }},
+    ]
+
+
+def _facet_count(facet):
+    return facet[0]['count'] if facet else 0
+
+
+def compute_user_stats(db, user_id):
+    """Build the stats document from scratch with one aggregation per collection."""
+    # The two aggregations are independent, so they run concurrently. No
+    # page deadline: a rebuild cut short would be repeated on every view.
+    results = fanout.gather({
+        'tasks': lambda: next(db['tasks'].aggregate(task_stats_pipeline(user_id))),
+        'diary': lambda: next(db['diary'].aggregate(diary_stats_pipeline(user_id))),
+    }, deadline_ms=fanout.NO_DEADLINE)
+    if len(results) < 2:
+        # Never materialize partial counts
+        raise RuntimeError('stats aggregation failed')
+    tasks, diary = results['tasks'], results['diary']
+
+    by_status = {}
+    for group in tasks['by_status']:
+        key = status_key(group['_id'])
+        by_status[key] = by_status.get(key, 0) + group['count']
+
+    by_month = {}
+    for group in diary['by_month']:
+        if group['_id']:
+            by_month[group['_id']] = group['count']
+
+    return {
+        '_id': user_id,
+        'tasks_total': _facet_count(tasks['total']),
+        'tasks_by_status': by_status,
+        'diary_total': _facet_count(diary['total']),
+        'diary_by_month': by_month,
+    }
+
+
+def find_user_stats(db, user_id, workload='interactive'):
+    """The stats document, or None when it has not been materialized yet."""
+    return read_routing.collection(db, STATS_COLLECTION, workload).find_one({'_id': user_id})
+
+
+def materialize_user_stats(db, user_id):
+    """Build and store a missing stats document; returns it."""
+    stats = compute_user_stats(db, user_id)
+    fields = {key: value for key, value in stats.items() if key != '_id'}
+    # $setOnInsert so a concurrent rebuild cannot clobber increments
+    # that landed after the first one created the document.
+    db[STATS_COLLECTION].update_one({'_id': user_id}, {'$setOnInsert': fields}, upsert=True)
+    return stats
+
+
+def get_user_stats(db, user_id, workload='interactive'):
+    """Return the stats document, materializing it on first use.
+
+    Only the document read follows ``workload``; a rebuild always reads
+    the primary, since a stale count would be kept by later increments.
+    """
+    stats = find_user_stats(db, user_id, workload)
+    if stats is None:
+        stats = materialize_user_stats(db, user_id)
+    return stats
+
+
+def refresh_user_stats(db, user_id):
+    """Recompute and overwrite the stats document (used after bulk changes)."""
+    stats = compute_user_stats(db, user_id)
+    db[STATS_COLLECTION].replace_one({'_id': user_id}, stats, upsert=True)
+    return stats
+
+
+def discard_user_stats(db, user_id):
+    """Drop the stats document, so the next read rebuilds it from the data."""
+    db[STATS_COLLECTION].delete_one({'_id': user_id})
+
+
+def summarize(stats, month=None):
+    month = month or datetime.now().strftime('%Y-%m')
+    by_status = stats.get('tasks_by_status', {})
+    return {
+        'total_tasks': stats.get('tasks_total', 0),
+        'pending_tasks': by_status.get('pending', 0),
+        'completed_tasks': by_status.get('completed', 0),
+        'total_entries': stats.get('diary_total', 0),
+        'this_month_entries': stats.get('diary_by_month', {}).get(month, 0),
+    }
+
+
+def _increment(db, user_id, counters):
+    counters = {key: value for key, value in counters.items() if value}
+    if counters:
+        # No upsert: a missing document is rebuilt in full on the next read,
+        # whereas upserting here would create one holding partial counts.
+        db[STATS_COLLECTION].update_one({'_id': user_id}, {'$inc': counters})
+
+
+def record_task_added(db, user_id, status):
+    _increment(db, user_id, {
+        'tasks_total': 1,
+        f'tasks_by_status.{status_key(status)}': 1,
+    })
+
+
+def record_task_status_change(db, user_id, old_status, new_status):
+    old_key, new_key = status_key(old_status), status_key(new_status)
+    if old_key != new_key:
+        _increment(db, user_id, {
+            f'tasks_by_status.{old_key}': -1,
+            f'tasks_by_status.{new_key}': 1,
+        })
+
+
+def record_task_deleted(db, user_id, status):
+    _increment(db, user_id, {
+        'tasks_total': -1,
+        f'tasks_by_status.{status_key(status)}': -1,
+    })
+
+
+def record_diary_added(db, user_id, date):
+    counters = {'diary_total': 1}
+    month = month_key(date)
+    if month:
+        counters[f'diary_by_month.{month}'] = 1
+    _increment(db, user_id, counters)
+
+
+def record_diary_date_change(db, user_id, old_date, new_date):
+    old_month, new_month = month_key(old_date), month_key(new_date)
+    if old_month == new_month:
+        return
+    counters = {}
+    if old_month:
+        counters[f'diary_by_month.{old_month}'] = -1
+    if new_month:
+        counters[f'diary_by_month.{new_month}'] = 1
+    _increment(db, user_id, counters)
+
+
+def record_diary_deleted(db, user_id, date):
+    counters = {'diary_total': -1}
+    month = month_key(date)
+    if month:
+        counters[f'diary_by_month.{month}'] = -1
+    _increment(db, user_id, counters)
@@ -0,0 +1,129 @@
+"""Delta sync for offline clients.
+
+Every task and diary write stamps ``updated_at`` (UTC) and every delete
+(or move to the archive) leaves a tombstone in the ``tombstones``
+collection. A sync token records,
+for each of the three sources, the ``(timestamp, _id)`` of the last change
+handed out. The next call reads only what comes after it, from a
+``(user_id, updated_at, _id)`` index, so a sync costs in proportion to
+what changed rather than to the size of the history.
+
+Delivery is at-least-once. Changes younger than ``SYNC_SETTLE_SECONDS``
+are returned, but the token does not move past them (on any page), so a
+write stamped slightly in the past (clock skew between workers, a slow
+commit) is still seen by the next sync. Clients apply changes by id, so
+repeats are harmless.
+"""
+
+import os
+from datetime import timedelta
+
+from api import DIARY_FIELDS, TASK_FIELDS, serialize
+from dates import utcnow
+from pagination import MAX_PAGE_SIZE, decode_token, encode_cursor, encode_token, paginate
+
+TOMBSTONES_COLLECTION = 'tombstones'
+SYNC_SETTLE_SECONDS = float(os.getenv('SYNC_SETTLE_SECONDS', '5'))
+# Tombstones expire (TTL index); older tokens must resync from scratch
+TOMBSTONE_TTL_DAYS = int(os.getenv('TOMBSTONE_TTL_DAYS', '90'))
+
+# Token key -> (collection, change timestamp field)
+SOURCES = {
+    'tasks': ('tasks', 'updated_at'),
+    'diary': ('diary', 'updated_at'),
+    'deleted': (TOMBSTONES_COLLECTION, 'deleted_at'),
+}
+
+
+class SyncTokenExpired(Exception):
+    """The token predates the tombstone retention window."""
+
+
+def record_deletions(db, user_id, kind, document_ids, reason='deleted'):
+    """Leave tombstones for removed documents of ``kind`` ('task' or 'diary').
+
+    ``reason`` is 'deleted', or 'archived' for documents moved out of the
+    hot collections (see archive.py).
+    """
+    now = utcnow()
+    tombstones = [{'user_id': user_id, 'kind': kind, 'doc_id': document_id, 'deleted_at': now,
+                   'reason': reason}
+                  for document_id in document_ids]
+    if tombstones:
+        db[TOMBSTONES_COLLECTION].insert_many(tombstones, ordered=False)
+
+
+def decode_sync_token(token):
+    """Per-source cursors from a sync token; raises ValueError if malformed."""
+    state = decode_token(token)
+    try:
+        issued_at = state['issued_at']
+        # A well-formed token with the wrong types is as invalid as a garbled one
+        expired = issued_at < utcnow() - timedelta(days=TOMBSTONE_TTL_DAYS)
+        if any(not isinstance(state.get(name), (str, type(None))) for name in SOURCES):
+            raise TypeError('cursor is not a string')
+    except (TypeError, KeyError) as e:
+        raise ValueError(f'invalid sync token: {e}')
+    if expired:
+        raise SyncTokenExpired()
+    return state
+
+
+def _advance(cursor, page, field, cutoff):
+    """The cursor after the page's settled changes, and whether that is the page's end.
+
+    Applied to every page, full or not: a full page can end in changes
+    that are still settling, and a write committed late may yet land
+    between them.
+    """
+    settled = None
+    for document in page:
+        value = document.get(field)
+        if value is not None and value > cutoff:
+            return (encode_cursor(field, settled) if settled is not None else cursor), False
+        settled = document
+    return (encode_cursor(field, settled) if settled is not None else cursor), True
+
+
+def forget_deletions(db, user_id, document_ids):
+    """Drop the tombstones of documents that are back (restored from the archive)."""
+    db[TOMBSTONES_COLLECTION].delete_many({'user_id': user_id, 'doc_id': {'$in': list(document_ids)}})
+
+
+def _serialize_tombstone(tombstone):
+    return {
+        'kind': tombstone['kind'],
+        'id': str(tombstone['doc_id']),
+        'deleted_at': tombstone['deleted_at'].isoformat(),
+        'reason': tombstone.get('reason', 'deleted'),
+    }
+
+
+def sync_changes(db, user_id, since=None, page_size=MAX_PAGE_SIZE):
+    """Changes for ``user_id`` after the ``since`` token (everything if None).
+
+    Returns the response body: changed ``tasks`` and ``diary`` entries,
+    ``deleted`` tombstones, a ``next_token`` and ``has_more``, which tells
+    the client to call again straight away with the new token.
+    """
+    state = decode_sync_token(since) if since else {}
+    now = utcnow()
+    cutoff = now - timedelta(seconds=SYNC_SETTLE_SECONDS)
+    fields = {'tasks': TASK_FIELDS, 'diary': DIARY_FIELDS}
+
+    body = {'has_more': False}
+    next_state = {'issued_at': now}
+    for name, (collection_name, field) in SOURCES.items():
+        cursor = state.get(name)
+        page = paginate(db[collection_name], {'user_id': user_id}, field, 1,
+                        after=cursor, page_size=page_size)
+        if name == 'deleted':
+            body[name] = [_serialize_tombstone(tombstone) for tombstone in page]
+        else:
+            body[name] = [serialize(document, fields[name]) for document in page]
+        next_state[name], settled = _advance(cursor, page, field, cutoff)
+        # A page cut short by the settle window waits for the next sync
+        # rather than having the client fetch the same page straight away
+        body['has_more'] = body['has_more'] or (page.next_cursor is not None and settled)
+    body['next_token'] = encode_token(next_state)
+    return body
@@ -0,0 +1,96 @@
+"""Per-user diary tag catalogue with usage counts.
+
+One ``diary_tags`` document per (user, tag) holds the number of entries
+carrying that tag. Diary writes adjust the counts, so the tag dropdown
+and autocomplete read a handful of small documents instead of every
+entry the user has written.
+"""
+
+import re
+
+from pymongo import UpdateOne
+
+TAGS_COLLECTION = 'diary_tags'
+SUGGESTION_LIMIT = 10
+
+
+def record_tags_change(db, user_id, old_tags, new_tags):
+    """Move tag counts from ``old_tags`` to ``new_tags`` for one entry."""
+    old_tags, new_tags = set(old_tags or []), set(new_tags or [])
+    operations = [
+        UpdateOne({'user_id': user_id, 'tag': tag}, {'$inc': {'count': 1}}, upsert=True)
+        for tag in new_tags - old_tags
+    ]
+    removed = old_tags - new_tags
+    operations += [
+        UpdateOne({'user_id': user_id, 'tag': tag}, {'$inc': {'count': -1}})
+        for tag in removed
+    ]
+    if not operations:
+        return
+    db[TAGS_COLLECTION].bulk_write(operations, ordered=False)
+    if removed:
+        db[TAGS_COLLECTION].delete_many({
+            'user_id': user_id,
+            'tag': {'$in': list(removed)},
+            'count': {'$lte': 0},
+        })
+
+
+def adjust_tag_counts(db, deltas):
+    """Apply ``{(user_id, tag): delta}`` in one bulk_write (archive/restore)."""
+    operations = [
+        UpdateOne({'user_id': user_id, 'tag': tag}, {'$inc': {'count': delta}}, upsert=delta > 0)
+        for (user_id, tag), delta in deltas.items() if delta
+    ]
+    if not operations:
+        return
+    db[TAGS_COLLECTION].bulk_write(operations, ordered=False)
+    db[TAGS_COLLECTION].delete_many({
+        'user_id': {'$in': list({user_id for user_id, _ in deltas})},
+        'count': {'$lte': 0},
+    })
+
+
+def list_tags(db, user_id):
+    """All of the user's tags in alphabetical order."""
+    cursor = db[TAGS_COLLECTION].find(
+        {'user_id': user_id, 'count': {'$gt': 0}},
+        {'_id': 0, 'tag': 1}
+    ).sort('tag', 1)
+    return [doc['tag'] for doc in cursor]
+
+
+def suggest_tags(db, user_id, prefix, limit=SUGGESTION_LIMIT):
+    """Tags starting with ``prefix``, most used first.
+
+    The prefix is escaped and anchored, so the lookup is a bounded range
+    scan on the (user_id, tag) index. The prefix matches are then sorted
+    by count in memory; no index order can serve that sort after a range
+    on ``tag``, and one user's matches are few. The limit applies after
+    the sort, so the most used tags are never cut off by alphabetically
+    earlier ones.
+    """
+    query = {'user_id': user_id, 'count': {'$gt': 0}}
+    if prefix:
+        query['tag'] = {'$regex': '^' + re.escape(prefix)}
+    cursor = db[TAGS_COLLECTION].find(
+        query, {'_id': 0, 'tag': 1, 'count': 1}
+    ).sort([('count', -1), ('tag', 1)]).limit(limit)
+    return list(cursor)
+
+
+def rebuild_tag_catalogue(db):
+    """Recompute the whole catalogue from the diary collection.
+
+    $out swaps the result in atomically and keeps the catalogue's indexes.
+    """
+    db['diary'].aggregate([
+        {'$match': {'tags.0': {'$exists': True}}},
+        # Count each tag once per entry even if it was entered twice
+        {'$project': {'user_id': 1, 'tags': {'$setUnion': ['$tags', []]}}},
+        {'$unwind': '$tags'},
+        {'$group': {'_id': {'user_id': '$user_id', 'tag': '$tags'}, 'count': {'$sum': 1}}},
+        {'$project': {'_id': 0, 'user_id': '$_id.user_id', 'tag': '$_id.tag', 'count': 1}},
+        {'$out': TAGS_COLLECTION},
+    ])
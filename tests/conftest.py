@@ -0,0 +1,108 @@
+"""Shared fixtures.
+
+Most tests run against an in-memory ``mongomock`` database. mongomock
+lacks a few server features the app relies on (``$unionWith``,
+``$merge``, ``$text``, ``$type``); tests of code that needs them take the
+``server_db`` fixture instead, which uses the MongoDB at
+``MONGODB_TEST_URI`` and is skipped when that is not set.
+"""
+
+import os
+import sys
+import uuid
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Before the app modules read their settings
+os.environ.setdefault('SCHEDULER_ENABLED', 'false')
+os.environ.setdefault('AUTO_CREATE_INDEXES', 'false')
+os.environ.setdefault('BCRYPT_ROUNDS', '4')
+os.environ.setdefault('JINJA_BYTECODE_CACHE', 'false')
+
+mongomock = pytest.importorskip('mongomock')
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient()['task_diary_test']
+
+
+@pytest.fixture
+def server_db():
+    uri = os.getenv('MONGODB_TEST_URI')
+    if not uri:
+        pytest.skip('needs a MongoDB server (set MONGODB_TEST_URI)')
+    from pymongo import MongoClient
+    client = MongoClient(uri, serverSelectionTimeoutMS=2000)
+    name = f'task_diary_test_{uuid.uuid4().hex[:8]}'
+    yield client[name]
+    client.drop_database(name)
+    client.close()
+
+
+@pytest.fixture
+def app():
+    import app as app_module
+    from data_version import version_cache
+    from fragments import fragment_cache
+    from user_context import user_cache
+
+    mongo = app_module.mongo
+    mongo.client_factory = mongomock.MongoClient
+    mongo._forget_client()
+    application = app_module.create_app({
+        'TESTING': True,
+        'SECRET_KEY': 'test',
+        'MONGODB_URI': 'mongodb://localhost',
+        'MONGODB_DB': 'task_diary_test',
+        'SCHEDULER_ENABLED': False,
+        'AUTO_CREATE_INDEXES': False,
+    })
+    for cache in (user_cache, version_cache, fragment_cache):
+        cache.clear()
+    yield application
+    mongo._forget_client()
+
+
+@pytest.fixture
+def app_db(app):
+    return app.extensions['mongo'].database
+
+
+@pytest.fixture
+def user_id(app_db):
+    result = app_db['users'].insert_one({'email': 'user@example.com', 'password': 'x',
+                                         'role': 'student'})
+    return str(result.inserted_id)
+
+
+@pytest.fixture
+def add_task():
+    """Insert a task with sensible defaults; returns a function giving its _id."""
+    def add(db, user_id='u1', **fields):
+        task = {'user_id': user_id, 'name': 't', 'description': '', 'status': 'pending',
+                'priority': 'low', 'due_date': None, 'overdue': False}
+        return db['tasks'].insert_one(dict(task, **fields)).inserted_id
+    return add
+
+
+@pytest.fixture
+def add_entry():
+    """Insert a diary entry with sensible defaults; returns a function giving its _id."""
+    def add(db, user_id='u1', **fields):
+        entry = {'user_id': user_id, 'title': 'entry', 'entry': '', 'tags': [],
+                 'date': datetime(2030, 1, 1)}
+        return db['diary'].insert_one(dict(entry, **fields)).inserted_id
+    return add
+
+
+@pytest.fixture
+def client(app, user_id):
+    """A test client logged in as ``user_id``."""
+    test_client = app.test_client()
+    with test_client.session_transaction() as session:
+        session['user_id'] = user_id
+    return test_client
@@ -0,0 +1,52 @@
+from datetime import date, datetime
+
+import activity
+
+
+def save_year(db, year, days, user_id='u1'):
+    db[activity.ACTIVITY_COLLECTION].insert_one(
+        {'_id': activity.activity_id(user_id, year), 'user_id': user_id, 'year': year, 'days': days})
+
+
+def test_streaks_and_totals(db):
+    save_year(db, 2030, {'03-01': 1, '03-02': 2, '03-03': 1, '03-05': 4, '03-06': 1, '03-07': 0})
+
+    calendar = activity.build_calendar(db, 'u1', 2030, date(2030, 3, 6))
+
+    assert calendar['longest_streak'] == 3
+    assert calendar['current_streak'] == 2
+    assert calendar['total'] == 9
+    assert calendar['active_days'] == 5
+    assert calendar['months'][2]['count'] == 9
+    assert all(len(week) == 7 for week in calendar['weeks'])
+
+
+def test_a_blank_today_does_not_break_the_streak_until_tomorrow(db):
+    save_year(db, 2030, {'03-04': 1, '03-05': 1})
+
+    assert activity.build_calendar(db, 'u1', 2030, date(2030, 3, 6))['current_streak'] == 2
+    assert activity.build_calendar(db, 'u1', 2030, date(2030, 3, 7))['current_streak'] == 0
+
+
+def test_current_streak_reaches_into_the_previous_year(db):
+    save_year(db, 2029, {'12-30': 1, '12-31': 1})
+    save_year(db, 2030, {'01-01': 1, '01-02': 1})
+
+    calendar = activity.build_calendar(db, 'u1', 2030, date(2030, 1, 2))
+
+    assert calendar['current_streak'] == 4
+    assert calendar['longest_streak'] == 2
+
+
+def test_entry_writes_adjust_the_day_counts(db):
+    save_year(db, 2030, {'03-01': 1})
+
+    activity.record_entry_added(db, 'u1', datetime(2030, 3, 1))
+    activity.record_entry_date_change(db, 'u1', datetime(2030, 3, 1), datetime(2030, 3, 2))
+    activity.record_entry_deleted(db, 'u1', datetime(2030, 3, 1))
+    # Legacy string dates and years never materialized are left alone
+    activity.record_entry_added(db, 'u1', '2030-03-01')
+    activity.record_entry_added(db, 'u1', datetime(2031, 1, 1))
+
+    assert activity.get_year(db, 'u1', 2030) == {'03-02': 1}
+    assert db[activity.ACTIVITY_COLLECTION].count_documents({}) == 1
@@ -0,0 +1,67 @@
+import time
+
+import api
+import data_version
+import read_routing
+
+
+def test_matching_etag_gets_a_304(client, app_db, user_id, add_task):
+    add_task(app_db, user_id, name='first')
+
+    response = client.get('/api/v1/tasks')
+    etag = response.headers['ETag']
+    repeat = client.get('/api/v1/tasks', headers={'If-None-Match': etag})
+
+    assert response.status_code == 200
+    assert repeat.status_code == 304
+    assert repeat.data == b''
+    assert repeat.headers['ETag'] == etag
+
+
+def test_a_write_changes_the_etag(client, app_db, user_id, add_task):
+    add_task(app_db, user_id, name='first')
+    etag = client.get('/api/v1/tasks').headers['ETag']
+
+    client.post('/add_task', data={'name': 'second', 'description': '', 'due_date': '2030-01-01',
+                                   'priority': 'low'})
+    response = client.get('/api/v1/tasks', headers={'If-None-Match': etag})
+
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert [task['name'] for task in response.get_json()['items']] == ['first', 'second']
+
+
+def test_etag_depends_on_the_requested_representation():
+    assert api.make_etag('u1', 3, '/api/v1/tasks?fields=name') != api.make_etag('u1', 3, '/api/v1/tasks?')
+    assert api.make_etag('u1', 3, '/api/v1/tasks?') != api.make_etag('u2', 3, '/api/v1/tasks?')
+    assert api.make_etag('u1', 3, '/api/v1/tasks?') != api.make_etag('u1', 4, '/api/v1/tasks?')
+
+
+def test_only_the_requested_fields_are_returned(client, app_db, user_id, add_task):
+    add_task(app_db, user_id, name='first')
+
+    item = client.get('/api/v1/tasks?fields=name').get_json()['items'][0]
+
+    assert set(item) == {'id', 'name'}
+
+
+def test_errors_are_not_given_an_etag(client):
+    response = client.get('/api/v1/tasks?fields=secret')
+
+    assert response.status_code == 400
+    assert 'ETag' not in response.headers
+
+
+def test_own_write_on_another_worker_is_not_answered_with_a_304(client, app_db, user_id, add_task):
+    add_task(app_db, user_id, name='first')
+    etag = client.get('/api/v1/tasks').headers['ETag']
+
+    # Another worker handled the write: this one still caches the old version
+    add_task(app_db, user_id, name='second')
+    app_db[data_version.VERSIONS_COLLECTION].update_one({'_id': user_id}, {'$inc': {'version': 1}},
+                                                        upsert=True)
+    assert client.get('/api/v1/tasks', headers={'If-None-Match': etag}).status_code == 304
+    with client.session_transaction() as session:
+        session[read_routing._SESSION_KEY] = time.time() + 60
+
+    assert client.get('/api/v1/tasks', headers={'If-None-Match': etag}).status_code == 200
@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import archive
+import sync
+from dates import utcnow
+
+
+@pytest.fixture
+def old_tasks(db):
+    stale = utcnow() - timedelta(days=archive.ARCHIVE_TASK_DAYS + 1)
+    result = db['tasks'].insert_many([
+        {'user_id': 'u1', 'name': f't{i}', 'status': 'completed', 'updated_at': stale,
+         'due_date': datetime(2020, 1, 1)}
+        for i in range(3)])
+    db['tasks'].insert_one({'user_id': 'u1', 'name': 'live', 'status': 'pending', 'updated_at': stale})
+    return result.inserted_ids
+
+
+def test_archival_moves_due_documents_and_tells_sync(db, old_tasks):
+    report = archive.run_archival(db, kinds=['tasks'], batch_size=2, pause=0)
+
+    assert report == {'tasks': 3}
+    assert [task['name'] for task in db['tasks'].find()] == ['live']
+    assert sorted(db['tasks_archive'].distinct('_id')) == sorted(old_tasks)
+    deleted = sync.sync_changes(db, 'u1')['deleted']
+    assert sorted(tombstone['id'] for tombstone in deleted) == sorted(str(i) for i in old_tasks)
+    assert {(tombstone['kind'], tombstone['reason']) for tombstone in deleted} == {('task', 'archived')}
+
+
+def test_interrupted_run_resumes_past_copied_documents(db, old_tasks):
+    # A crash after the copy left the first task in both collections
+    db['tasks_archive'].insert_one(dict(db['tasks'].find_one({'_id': old_tasks[0]}), archived_at=utcnow()))
+
+    assert archive.run_archival(db, kinds=['tasks'], pause=0) == {'tasks': 3}
+    assert db['tasks_archive'].count_documents({}) == 3
+    assert db['tasks'].count_documents({'_id': {'$in': old_tasks}}) == 0
+
+
+def test_document_changed_during_the_move_stays_hot(monkeypatch, db, old_tasks):
+    copy = archive._copy
+
+    def copy_then_reopen(collection, documents):
+        copy(collection, documents)
+        db['tasks'].update_one({'_id': old_tasks[0]},
+                               {'$set': {'status': 'pending', 'updated_at': utcnow()}})
+    monkeypatch.setattr(archive, '_copy', copy_then_reopen)
+
+    moved = archive.archive_batch(db, 'tasks', archive.archive_criteria('tasks'))
+
+    assert moved == 2
+    assert db['tasks'].find_one({'_id': old_tasks[0]})['status'] == 'pending'
+    assert db['tasks_archive'].find_one({'_id': old_tasks[0]}) is None
+    assert db[sync.TOMBSTONES_COLLECTION].find_one({'doc_id': old_tasks[0]}) is None
+
+
+def test_restore_brings_the_document_back_for_sync(db, old_tasks):
+    archive.run_archival(db, kinds=['tasks'], pause=0)
+
+    assert archive.restore(db, 'tasks', 'u1', old_tasks[0])
+    assert not archive.restore(db, 'tasks', 'someone-else', old_tasks[1])
+
+    restored = db['tasks'].find_one({'_id': old_tasks[0]})
+    assert 'archived_at' not in restored
+    assert restored['updated_at'] > utcnow() - timedelta(minutes=1)
+    assert db['tasks_archive'].find_one({'_id': old_tasks[0]}) is None
+    body = sync.sync_changes(db, 'u1')
+    assert str(old_tasks[0]) not in [tombstone['id'] for tombstone in body['deleted']]
+
+
+def test_diary_archival_updates_the_tag_catalogue(monkeypatch, db):
+    monkeypatch.setattr(archive, 'ARCHIVE_DIARY_DAYS', 30)
+    old = utcnow() - timedelta(days=60)
+    db['diary'].insert_one({'user_id': 'u1', 'title': 'old', 'date': old, 'updated_at': old,
+                            'tags': ['work']})
+    db['diary_tags'].insert_one({'user_id': 'u1', 'tag': 'work', 'count': 1})
+
+    assert archive.run_archival(db, kinds=['diary'], pause=0) == {'diary': 1}
+    assert db['diary_tags'].find_one({'user_id': 'u1', 'tag': 'work'}) is None
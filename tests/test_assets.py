@@ -0,0 +1,35 @@
+import glob
+import os
+import re
+
+import assets
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_templates_have_no_inline_scripts():
+    inline = re.compile(r'<script(?![^>]*\bsrc=)[^>]*>')
+    offenders = [os.path.relpath(path, ROOT)
+                 for path in glob.glob(os.path.join(ROOT, 'templates', '**', '*.html'), recursive=True)
+                 if inline.search(open(path, encoding='utf-8').read())]
+    assert offenders == []
+
+
+def test_build_fingerprints_every_script(tmp_path):
+    manifest = assets.build(os.path.join(ROOT, 'static'), str(tmp_path))
+    assert 'js/tag_autocomplete.js' in manifest
+    built = manifest['js/tag_autocomplete.js']
+    assert re.fullmatch(r'js/tag_autocomplete\.[0-9a-f]{12}\.js', built)
+    assert (tmp_path / built).is_file()
+
+
+def test_built_assets_are_served_immutable(app, tmp_path):
+    manifest = assets.build(os.path.join(ROOT, 'static'), str(tmp_path))
+    served = assets.Assets()
+    served.directory = str(tmp_path)
+    served.load()
+    with app.test_request_context('/', headers={'Accept-Encoding': 'gzip'}):
+        response = served.send(manifest['js/tag_autocomplete.js'])
+        assert response.headers['Cache-Control'] == assets.CACHE_CONTROL
+        assert response.headers['Content-Encoding'] == 'gzip'
+        response.close()
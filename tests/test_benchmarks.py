@@ -0,0 +1,81 @@
+import argparse
+import logging
+
+import pytest
+
+import app as app_module
+import stats
+from benchmarks import datagen, run
+
+
+@pytest.fixture
+def problems():
+    handler = run.LoggedProblems()
+    logging.getLogger().addHandler(handler)
+    yield handler
+    logging.getLogger().removeHandler(handler)
+
+
+def test_degraded_dashboard_counts_as_failed(monkeypatch, app, user_id, problems):
+    def fail(db, uid, workload):
+        raise RuntimeError('stats read timed out')
+    monkeypatch.setattr(stats, 'find_user_stats', fail)
+    driver = run.TestClientDriver(app, [user_id], problems)
+
+    status, failed = driver.get(driver.client(0), '/dashboard')
+
+    assert run.DEGRADED_HEADER == app_module.DEGRADED_HEADER
+    assert status == 200
+    assert failed
+
+
+def test_logged_errors_count_as_failed(monkeypatch, app, user_id, problems):
+    driver = run.TestClientDriver(app, [user_id], problems)
+    client = driver.client(0)
+    assert driver.get(client, '/tasks') == (200, False)
+
+    def fail(*args, **kwargs):
+        raise RuntimeError('query failed')
+    monkeypatch.setattr(app_module, 'paginate', fail)
+
+    assert driver.get(client, '/tasks')[1]
+
+
+def test_failed_requests_stay_out_of_the_latencies():
+    result = run.summarize([0.01, 0.02], {200: 5}, 1.0, None, failed=3)
+
+    assert result['requests'] == 2
+    assert result['failed'] == 3
+
+
+def test_benchmark_app_runs_without_the_scheduler(monkeypatch):
+    started = []
+    monkeypatch.setattr(app_module.scheduler, 'start', lambda: started.append(True))
+    args = argparse.Namespace(in_memory=True, uri=None, db_name='task_diary_bench_test',
+                              log_level='CRITICAL')
+    root = logging.getLogger()
+    handlers, level = {handler: handler.level for handler in root.handlers}, root.level
+    try:
+        application, mongo, problems = run.build_app(args)
+        application.test_client().get('/login')
+        assert not started
+        assert problems in root.handlers
+        assert root.isEnabledFor(logging.WARNING)
+    finally:
+        for handler in list(root.handlers):
+            if handler in handlers:
+                handler.setLevel(handlers[handler])
+            else:
+                root.removeHandler(handler)
+        root.setLevel(level)
+        app_module.mongo._forget_client()
+
+
+def test_seeded_data_carries_the_fields_the_app_maintains(db):
+    datagen.seed(db, users=3, tasks_per_user=40, entries_per_user=10)
+
+    assert db['tasks'].count_documents({'overdue': True}) > 0
+    assert db['tasks'].count_documents({'updated_at': {'$exists': False}}) == 0
+    assert db['diary'].count_documents({'excerpt': {'$exists': False}}) == 0
+    assert db['diary'].count_documents({'updated_at': {'$exists': False}}) == 0
+    assert db['diary_tags'].count_documents({}) > 0
@@ -0,0 +1,88 @@
+import io
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+import bulk_tasks
+
+
+def run_import(db, text, fmt, **kwargs):
+    return bulk_tasks.import_tasks(db['tasks'], 'u1', io.BytesIO(text.encode('utf-8')), fmt,
+                                   **kwargs).as_dict()
+
+
+def test_csv_import_reports_bad_rows_by_line_and_keeps_the_rest(db):
+    text = ('﻿name,due_date,priority,status\n'
+            'Report,2030-01-02,HIGH,\n'
+            ',2030-01-02,low,pending\n'
+            'Essay,02/01/2030,low,pending\n'
+            'Slides,2030-01-03,urgent,pending\n'
+            'Review,2030-01-04,low,done\n')
+
+    report = run_import(db, text, 'csv', batch_size=1)
+
+    assert (report['rows'], report['inserted'], report['failed']) == (5, 1, 4)
+    assert [error['row'] for error in report['errors']] == [3, 4, 5, 6]
+    assert 'name is required' in report['errors'][0]['error']
+    task = db['tasks'].find_one()
+    assert (task['name'], task['priority'], task['status']) == ('Report', 'high', 'pending')
+    assert task['due_date'] == datetime(2030, 1, 2)
+    assert task['user_id'] == 'u1' and 'updated_at' in task
+
+
+def test_ndjson_import_skips_blank_lines_and_reports_invalid_json(db):
+    text = '{"name": "a", "due_date": "2030-01-01"}\n\n{not json\n[1]\n'
+
+    report = run_import(db, text, 'ndjson')
+
+    assert (report['rows'], report['inserted'], report['failed']) == (3, 1, 2)
+    assert report['errors'][0]['row'] == 3 and report['errors'][0]['error'].startswith('invalid JSON')
+    assert report['errors'][1] == {'row': 4, 'error': 'expected an object'}
+
+
+def test_only_the_first_errors_are_kept(monkeypatch, db):
+    monkeypatch.setattr(bulk_tasks, 'MAX_REPORTED_ERRORS', 2)
+
+    report = run_import(db, '[]\n' * 5, 'ndjson')
+
+    assert report['failed'] == 5
+    assert len(report['errors']) == 2
+
+
+def test_undecodable_input_stops_the_import_but_keeps_earlier_rows(db):
+    data = b'{"name": "a", "due_date": "2030-01-01"}\n' + b'\xff\xfe\n'
+
+    report = bulk_tasks.import_tasks(db['tasks'], 'u1', io.BytesIO(data), 'ndjson').as_dict()
+
+    assert report['inserted'] == 1
+    assert 'unreadable input' in report['errors'][-1]['error']
+
+
+def test_failed_inserts_are_reported_against_their_rows(db):
+    db['tasks'].create_index('name', unique=True)
+    db['tasks'].insert_one({'name': 'taken'})
+    text = '{"name": "taken", "due_date": "2030-01-01"}\n{"name": "free", "due_date": "2030-01-01"}\n'
+
+    report = run_import(db, text, 'ndjson')
+
+    assert report['inserted'] == 1
+    assert [error['row'] for error in report['errors']] == [1]
+
+
+def test_unknown_format_is_refused(db):
+    with pytest.raises(ValueError):
+        run_import(db, '', 'xlsx')
+
+
+def test_bulk_actions_only_touch_the_users_tasks(db):
+    mine = db['tasks'].insert_one({'user_id': 'u1', 'status': 'pending'}).inserted_id
+    theirs = db['tasks'].insert_one({'user_id': 'u2', 'status': 'pending'}).inserted_id
+    ids = bulk_tasks.parse_task_ids([str(mine), str(theirs), str(mine), 'junk'])
+
+    assert ids == [mine, theirs]
+    assert bulk_tasks.apply_bulk_action(db['tasks'], 'u1', ids, 'complete') == 1
+    assert db['tasks'].find_one({'_id': theirs})['status'] == 'pending'
+    assert bulk_tasks.owned_task_ids(db['tasks'], 'u1', ids + [ObjectId()]) == [mine]
+    with pytest.raises(ValueError):
+        bulk_tasks.apply_bulk_action(db['tasks'], 'u1', ids, 'reprioritize', priority='urgent')
@@ -0,0 +1,34 @@
+import pytest
+
+import excerpts
+from migrations import backfill_diary_excerpts
+
+
+def test_short_entries_are_not_truncated():
+    fields = excerpts.excerpt_fields('well-known, state-of-the-art\n\ntext')
+
+    assert fields == {'excerpt': 'well-known, state-of-the-art text', 'word_count': 3,
+                      'truncated': False}
+
+
+def test_long_entries_are_cut_at_a_word_and_flagged():
+    fields = excerpts.excerpt_fields('word ' * 100)
+
+    assert fields['excerpt'] == 'word ' * (excerpts.EXCERPT_LENGTH // 5 - 1) + 'word…'
+    assert (fields['word_count'], fields['truncated']) == (100, True)
+
+
+@pytest.mark.parametrize('body, shown', [('short, hyphen-ated entry', False), ('word ' * 200, True)])
+def test_diary_offers_the_full_entry_only_when_truncated(client, app_db, user_id, add_entry,
+                                                         body, shown):
+    add_entry(app_db, user_id, entry=body, **excerpts.excerpt_fields(body))
+
+    assert (b'Show full entry' in client.get('/diary').data) is shown
+
+
+def test_backfill_adds_the_flag_to_entries_excerpted_before_it_existed(db, add_entry):
+    add_entry(db, entry='text', excerpt='text', word_count=1)
+
+    backfill_diary_excerpts(db)
+
+    assert db['diary'].find_one()['truncated'] is False
@@ -0,0 +1,63 @@
+import csv
+import gzip
+import io
+import json
+from datetime import datetime
+
+import pytest
+
+import exports
+
+
+def test_csv_quotes_values_and_writes_the_header_alone_for_no_rows():
+    rows = list(exports.csv_rows([{'name': 'a, "b"', 'due_date': datetime(2030, 1, 2)}],
+                                 ('name', 'due_date', 'status')))
+
+    assert list(csv.reader(io.StringIO(''.join(rows)))) == [
+        ['name', 'due_date', 'status'], ['a, "b"', '2030-01-02', '']]
+    assert list(exports.csv_rows([], ('name',))) == ['name\r\n']
+
+
+def test_ndjson_writes_one_object_per_line():
+    rows = list(exports.ndjson_rows([{'title': 'é', 'date': datetime(2030, 1, 2), 'tags': ['x']}],
+                                    ('date', 'title', 'tags', 'entry')))
+
+    assert rows == ['{"date": "2030-01-02", "title": "é", "tags": ["x"], "entry": null}\n']
+
+
+def test_coalesce_joins_rows_into_chunks():
+    chunks = list(exports.coalesce(['ab', 'cd', 'e'], chunk_size=3))
+
+    assert chunks == [b'abcd', b'e']
+
+
+def test_gzip_stream_is_one_valid_gzip_file():
+    chunks = [b'x' * 1000, b'y' * 1000]
+
+    assert gzip.decompress(b''.join(exports.gzip_stream(iter(chunks)))) == b''.join(chunks)
+
+
+@pytest.mark.parametrize('fmt, mimetype', [('txt', 'text/plain'), ('csv', 'text/csv'),
+                                           ('ndjson', 'application/x-ndjson'),
+                                           ('xml', 'text/plain')])
+def test_download_tasks_formats(client, app_db, user_id, add_task, fmt, mimetype):
+    add_task(app_db, user_id, name='Write report', due_date=datetime(2030, 1, 2))
+
+    response = client.get(f'/download_tasks?format={fmt}')
+
+    assert response.status_code == 200
+    assert response.mimetype == mimetype
+    assert 'Write report' in response.get_data(as_text=True)
+    assert response.headers['Content-Disposition'].endswith(f".{'txt' if fmt == 'xml' else fmt}")
+
+
+def test_gzipped_diary_export_only_holds_the_users_entries(client, app_db, user_id, add_entry):
+    add_entry(app_db, user_id, title='mine', entry='body', tags=['work'])
+    add_entry(app_db, 'someone-else', title='theirs')
+
+    response = client.get('/export_diary?format=ndjson&gzip=1')
+
+    assert response.mimetype == 'application/gzip'
+    assert response.headers['Content-Disposition'].endswith('diary.ndjson.gz')
+    lines = gzip.decompress(response.get_data()).decode().splitlines()
+    assert [json.loads(line)['title'] for line in lines] == ['mine']
@@ -0,0 +1,27 @@
+import time
+
+import fanout
+
+
+def slow(value, seconds=0.2):
+    def call():
+        time.sleep(seconds)
+        return value
+    return call
+
+
+def test_gather_drops_calls_that_miss_the_deadline():
+    results = fanout.gather({'fast': lambda: 1, 'slow': slow(2)}, deadline_ms=20)
+    assert results == {'fast': 1}
+
+
+def test_gather_leaves_out_failed_calls():
+    def fail():
+        raise RuntimeError('boom')
+    assert fanout.gather({'ok': lambda: 1, 'failed': fail}) == {'ok': 1}
+
+
+def test_gather_without_deadline_waits_for_every_call(monkeypatch):
+    monkeypatch.setattr(fanout, 'FANOUT_DEADLINE_MS', 10)
+    results = fanout.gather({'a': slow(1), 'b': slow(2)}, deadline_ms=fanout.NO_DEADLINE)
+    assert results == {'a': 1, 'b': 2}
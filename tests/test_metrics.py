@@ -0,0 +1,29 @@
+from types import SimpleNamespace
+
+import metrics
+
+
+def command_event(name, command, request_id=1):
+    return SimpleNamespace(command_name=name, command=command, request_id=request_id,
+                           connection_id=('localhost', 27017), duration_micros=1000)
+
+
+def test_get_more_is_labelled_with_its_collection():
+    timer = metrics.CommandTimer(slow_query_ms=-1)
+
+    timer.started(command_event('getMore', {'getMore': 12345, 'collection': 'tasks'}))
+    timer.succeeded(command_event('getMore', {}))
+
+    samples = '\n'.join(metrics.mongo_command_latency.samples())
+    assert 'collection="tasks",command="getMore"' in samples
+    assert 'collection="-",command="getMore"' not in samples
+
+
+def test_cache_lookups_are_exported_as_counters(client):
+    client.get('/')
+
+    body = client.get('/metrics').get_data(as_text=True)
+
+    assert '# TYPE user_cache_lookups_total counter' in body
+    assert '# TYPE fragment_cache_lookups_total counter' in body
+    assert 'user_cache_lookups_total{result="hit"}' in body
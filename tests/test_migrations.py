@@ -0,0 +1,38 @@
+from datetime import datetime
+
+import activity
+import data_version
+import rollups
+import stats
+
+
+def test_migrate_dates_resets_data_derived_from_string_dates(monkeypatch, app, app_db, user_id):
+    app_db['diary'].insert_one({'user_id': user_id, 'title': 'old', 'entry': '', 'date': '2024-03-05'})
+    app_db[stats.STATS_COLLECTION].insert_one({'_id': user_id, 'diary_total': 1, 'diary_by_month': {}})
+    app_db[activity.ACTIVITY_COLLECTION].insert_one({'_id': activity.activity_id(user_id, 2024)})
+    rebuilt, rolled_up = [], []
+    monkeypatch.setattr(stats, 'compute_user_stats', lambda db, uid: rebuilt.append(uid) or {'_id': uid})
+    monkeypatch.setattr(rollups, 'run_rollups',
+                        lambda db, full=False: rolled_up.append(full) or {'users': 1, 'groups': 0})
+    version = data_version.get_version(app_db, user_id)
+
+    result = app.test_cli_runner().invoke(args=['migrate-dates'])
+
+    assert result.exit_code == 0, result.output
+    assert app_db['diary'].find_one()['date'] == datetime(2024, 3, 5)
+    assert rebuilt == [user_id]
+    assert rolled_up == [True]
+    assert app_db[activity.ACTIVITY_COLLECTION].count_documents({}) == 0
+    assert data_version.get_version(app_db, user_id) > version
+
+
+def test_dry_run_leaves_derived_data_alone(monkeypatch, app, app_db, user_id):
+    app_db['diary'].insert_one({'user_id': user_id, 'title': 'old', 'entry': '', 'date': '2024-03-05'})
+    app_db[activity.ACTIVITY_COLLECTION].insert_one({'_id': activity.activity_id(user_id, 2024)})
+    monkeypatch.setattr(rollups, 'run_rollups', lambda *args, **kwargs: 1 / 0)
+
+    result = app.test_cli_runner().invoke(args=['migrate-dates', '--dry-run'])
+
+    assert result.exit_code == 0, result.output
+    assert app_db['diary'].find_one()['date'] == '2024-03-05'
+    assert app_db[activity.ACTIVITY_COLLECTION].count_documents({}) == 1
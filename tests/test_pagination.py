@@ -0,0 +1,61 @@
+from datetime import datetime
+
+import pytest
+
+from pagination import decode_cursor, encode_cursor, paginate
+
+
+@pytest.fixture
+def tasks(db):
+    collection = db['tasks']
+    # Duplicate due dates exercise the _id tiebreaker, the None one the null branch
+    days = [datetime(2030, 1, 1), datetime(2030, 1, 1), datetime(2030, 1, 2), None,
+            datetime(2030, 1, 3), datetime(2030, 1, 3), datetime(2030, 1, 4)]
+    collection.insert_many([{'user_id': 'u1', 'name': f't{i}', 'due_date': day}
+                            for i, day in enumerate(days)])
+    return collection
+
+
+def names(page):
+    return [task['name'] for task in page]
+
+
+def walk(collection, direction):
+    seen, page = [], paginate(collection, {'user_id': 'u1'}, 'due_date', direction, page_size=2)
+    while True:
+        seen.extend(names(page))
+        if not page.next_cursor:
+            return seen
+        page = paginate(collection, {'user_id': 'u1'}, 'due_date', direction,
+                        after=page.next_cursor, page_size=2)
+
+
+@pytest.mark.parametrize('direction', [1, -1])
+def test_walking_forward_visits_every_document_once_in_order(tasks, direction):
+    expected = [task['name'] for task in tasks.find().sort([('due_date', direction), ('_id', direction)])]
+
+    assert walk(tasks, direction) == expected
+
+
+def test_previous_cursor_returns_the_page_before(tasks):
+    first = paginate(tasks, {'user_id': 'u1'}, 'due_date', page_size=3)
+    second = paginate(tasks, {'user_id': 'u1'}, 'due_date', after=first.next_cursor, page_size=3)
+    back = paginate(tasks, {'user_id': 'u1'}, 'due_date', before=second.prev_cursor, page_size=3)
+
+    assert first.prev_cursor is None
+    assert names(back) == names(first)
+    assert back.next_cursor is not None
+
+
+def test_cursor_for_another_sort_field_is_ignored(tasks):
+    document = tasks.find_one({'name': 't2'})
+    cursor = encode_cursor('priority', document)
+
+    assert decode_cursor(cursor, 'due_date') is None
+    assert decode_cursor('not a cursor', 'due_date') is None
+    assert decode_cursor(encode_cursor('due_date', document), 'due_date') == (
+        document['due_date'], document['_id'])
+
+
+def test_page_size_is_clamped(tasks):
+    assert len(paginate(tasks, {'user_id': 'u1'}, 'due_date', page_size=0)) == 1
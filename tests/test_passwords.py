@@ -0,0 +1,39 @@
+import pytest
+from werkzeug.security import generate_password_hash
+
+import passwords
+
+
+@pytest.fixture
+def werkzeug_scheme(monkeypatch):
+    def configure(method):
+        monkeypatch.setattr(passwords, 'PASSWORD_SCHEME', 'werkzeug')
+        monkeypatch.setattr(passwords, 'PASSWORD_METHOD', method)
+        passwords.werkzeug_method.cache_clear()
+    yield configure
+    passwords.werkzeug_method.cache_clear()
+
+
+@pytest.mark.parametrize('method', ['pbkdf2:sha256:600000', 'pbkdf2', 'scrypt'])
+def test_fresh_werkzeug_hash_needs_no_rehash(werkzeug_scheme, method):
+    werkzeug_scheme(method)
+
+    assert not passwords.needs_rehash(passwords.hash_password_now('secret'))
+
+
+def test_werkzeug_cost_change_needs_rehash(werkzeug_scheme):
+    werkzeug_scheme('pbkdf2:sha256:600000')
+
+    assert passwords.needs_rehash(generate_password_hash('secret', method='pbkdf2:sha256:1000'))
+    # Switching schemes upgrades bcrypt hashes too
+    assert passwords.needs_rehash('$2b$04$' + 'x' * 53)
+
+
+def test_bcrypt_cost_change_needs_rehash(monkeypatch):
+    monkeypatch.setattr(passwords, 'PASSWORD_SCHEME', 'bcrypt')
+    stored = passwords.hash_password_now('secret')
+
+    assert not passwords.needs_rehash(stored)
+    monkeypatch.setattr(passwords, 'BCRYPT_ROUNDS', passwords.BCRYPT_ROUNDS + 1)
+    assert passwords.needs_rehash(stored)
+    assert passwords.needs_rehash(generate_password_hash('secret', method='pbkdf2'))
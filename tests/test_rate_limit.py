@@ -0,0 +1,74 @@
+import pytest
+
+import app as app_module
+import passwords
+import rate_limit
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_limit.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_bucket_allows_a_burst_then_refills(clock):
+    limiter = rate_limit.TokenBucketLimiter('test', rate=1, burst=3)
+
+    assert [limiter.hit('k') for _ in range(3)] == [0, 0, 0]
+    assert limiter.hit('k') == pytest.approx(1.0)
+    clock[0] += 1
+    assert limiter.hit('k') == 0
+    assert limiter.hit('k') > 0
+
+
+def test_keys_have_separate_buckets(clock):
+    limiter = rate_limit.TokenBucketLimiter('test', rate=1, burst=1)
+
+    assert limiter.hit('a') == 0
+    assert limiter.hit('b') == 0
+    assert limiter.hit('a') > 0
+
+
+def test_zero_rate_disables_the_limiter(clock):
+    limiter = rate_limit.TokenBucketLimiter('test', rate=0, burst=1)
+
+    assert [limiter.hit('k') for _ in range(5)] == [0] * 5
+
+
+def test_login_is_refused_before_the_password_check(monkeypatch, app, user_id):
+    monkeypatch.setattr(rate_limit, 'login_email_limiter',
+                        rate_limit.TokenBucketLimiter('login_email', rate=0.001, burst=1))
+    monkeypatch.setattr(rate_limit, 'login_ip_limiter',
+                        rate_limit.TokenBucketLimiter('login_ip', rate=0.001, burst=100))
+    checked = []
+    monkeypatch.setattr(passwords, 'verify_password', lambda *args: checked.append(args) or False)
+    client = app.test_client()
+
+    first = client.post('/login', data={'email': 'user@example.com', 'password': 'x'})
+    second = client.post('/login', data={'email': ' User@example.com', 'password': 'x'})
+
+    assert first.status_code != 429
+    assert second.status_code == 429
+    assert int(second.headers['Retry-After']) >= 1
+    # Only the first attempt reached the hash check
+    assert len(checked) == 1
+
+
+def test_trusted_proxy_gives_each_client_its_own_bucket(monkeypatch, app):
+    monkeypatch.setattr(rate_limit, 'login_ip_limiter',
+                        rate_limit.TokenBucketLimiter('login_ip', rate=0.001, burst=1))
+    monkeypatch.setattr(rate_limit, 'login_email_limiter',
+                        rate_limit.TokenBucketLimiter('login_email', rate=0, burst=1))
+    app_module.configure_proxy_fix(1)
+    client = app.test_client()
+
+    def login(ip):
+        return client.post('/login', data={'email': 'nobody@example.com', 'password': 'x'},
+                           headers={'X-Forwarded-For': ip}).status_code
+    try:
+        assert login('10.0.0.1') != 429
+        assert login('10.0.0.2') != 429
+        assert login('10.0.0.1') == 429
+    finally:
+        app_module.configure_proxy_fix(0)
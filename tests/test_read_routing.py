@@ -0,0 +1,68 @@
+from pymongo.read_preferences import SecondaryPreferred
+
+import read_routing
+import stats
+from fragments import fragment_cache
+
+
+def test_workloads_use_their_configured_read_preference(app):
+    with app.test_request_context():
+        assert read_routing.resolve('export') == 'export'
+        assert read_routing.reads_primary('interactive')
+        assert not read_routing.reads_primary('analytics')
+
+
+def test_a_write_pins_the_users_reads_to_the_primary(app):
+    with app.test_request_context():
+        read_routing.note_write()
+        assert read_routing.resolve('export') == read_routing.OWN_WRITES
+        assert read_routing.reads_primary('analytics')
+
+
+def test_mutating_requests_set_the_pin(client):
+    client.post('/add_task', data={'name': 't', 'description': '', 'due_date': '2030-01-01',
+                                   'priority': 'low'})
+    with client.session_transaction() as session:
+        assert 'read_primary_until' in session
+
+
+def test_reading_pages_does_not_set_the_pin(client):
+    client.get('/tasks')
+    with client.session_transaction() as session:
+        assert 'read_primary_until' not in session
+
+
+def seed_stats(app_db, user_id):
+    app_db[stats.STATS_COLLECTION].insert_one({'_id': user_id, 'tasks_total': 4,
+                                               'tasks_by_status': {'pending': 4},
+                                               'diary_total': 0, 'diary_by_month': {}})
+
+
+def cached_panels():
+    return {key[0] for key in fragment_cache._data}
+
+
+def test_dashboard_panels_read_from_the_primary_are_cached(client, app_db, user_id):
+    seed_stats(app_db, user_id)
+    assert client.get('/dashboard').status_code == 200
+    assert 'dashboard_stats' in cached_panels()
+
+
+def test_dashboard_panels_read_from_a_secondary_are_not_cached(monkeypatch, client, app_db, user_id):
+    monkeypatch.setitem(read_routing.READ_PREFERENCES, 'interactive', SecondaryPreferred())
+    seed_stats(app_db, user_id)
+    response = client.get('/dashboard')
+    assert response.status_code == 200
+    assert b'4' in response.data
+    assert 'dashboard_stats' not in cached_panels()
+    client.get('/')
+    assert 'index_stats' not in cached_panels()
+
+
+def test_fallback_panels_are_not_cached_or_escaped(monkeypatch, client):
+    def fail(db, user_id):
+        raise RuntimeError('aggregation failed')
+    monkeypatch.setattr(stats, 'compute_user_stats', fail)
+    response = client.get('/dashboard')
+    assert b'<h2>Task Overview</h2>' in response.data
+    assert 'dashboard_stats' not in cached_panels()
@@ -0,0 +1,46 @@
+from datetime import timedelta
+
+import reminders
+from dates import today
+
+
+def test_completing_an_overdue_task_clears_the_flag(client, app_db, user_id, add_task):
+    task_id = add_task(app_db, user_id, status='pending', due_date=today() - timedelta(days=3),
+                       overdue=True)
+    client.post(f'/update_task/{task_id}', data={'status': 'completed'})
+    task = app_db['tasks'].find_one({'_id': task_id})
+    assert (task['status'], task['overdue']) == ('completed', False)
+
+
+def test_reopening_a_past_due_task_flags_it(client, app_db, user_id, add_task):
+    task_id = add_task(app_db, user_id, status='completed', due_date=today() - timedelta(days=3))
+    client.post(f'/update_task/{task_id}', data={'status': 'pending'})
+    assert app_db['tasks'].find_one({'_id': task_id})['overdue'] is True
+
+
+def test_reopening_keeps_legacy_and_future_due_dates_unflagged(client, app_db, user_id, add_task):
+    legacy = add_task(app_db, user_id, status='completed', due_date='someday')
+    future = add_task(app_db, user_id, status='completed', due_date=today() + timedelta(days=3))
+    for task_id in (legacy, future):
+        client.post(f'/update_task/{task_id}', data={'status': 'pending'})
+        assert app_db['tasks'].find_one({'_id': task_id})['overdue'] is False
+
+
+def test_sweep_flags_tasks_that_fell_due(db, add_task):
+    past = add_task(db, 'u1', status='pending', due_date=today() - timedelta(days=1))
+    done = add_task(db, 'u1', status='completed', due_date=today() - timedelta(days=1))
+    upcoming = add_task(db, 'u1', status='pending', due_date=today() + timedelta(days=1))
+
+    assert reminders.sweep_overdue(db, pause=0) == 1
+    flags = {task['_id']: task['overdue'] for task in db['tasks'].find()}
+    assert flags == {past: True, done: False, upcoming: False}
+    # The next sweep starts from where this one stopped
+    assert reminders.sweep_overdue(db, pause=0) == 0
+
+
+def test_reminders_are_sent_once_per_due_date(db, add_task):
+    add_task(db, 'u1', status='pending', due_date=today())
+    sent = []
+    assert reminders.sweep_reminders(db, notify=lambda db, task: sent.append(task['_id']), pause=0) == 1
+    assert reminders.sweep_reminders(db, notify=lambda db, task: sent.append(task['_id']), pause=0) == 0
+    assert len(sent) == 1
@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta
+
+import rollups
+from dates import utcnow
+
+MAY_1, MAY_2, MAY_3 = datetime(2024, 5, 1), datetime(2024, 5, 2), datetime(2024, 5, 3)
+
+
+def test_deleting_a_task_marks_its_day(client, app_db, user_id):
+    task_id = app_db['tasks'].insert_one({'user_id': user_id, 'name': 't', 'status': 'pending',
+                                          'due_date': MAY_1}).inserted_id
+    client.get(f'/delete_task/{task_id}')
+    assert [(marker['user_id'], marker['day'])
+            for marker in app_db[rollups.DIRTY_DAYS_COLLECTION].find()] == [(user_id, '2024-05-01')]
+
+
+def test_changed_days_combines_updated_documents_and_markers(db):
+    since = utcnow() - timedelta(minutes=1)
+    db['tasks'].insert_many([
+        {'user_id': 'u1', 'due_date': MAY_1, 'updated_at': utcnow()},
+        {'user_id': 'u1', 'due_date': MAY_3, 'updated_at': since - timedelta(days=1)},
+        {'user_id': 'u2', 'due_date': 'someday', 'updated_at': utcnow()},
+    ])
+    db['diary'].insert_one({'user_id': 'u2', 'date': MAY_2, 'updated_at': utcnow()})
+    rollups.record_changed_days(db, 'u1', [MAY_2, None])
+
+    days, markers = rollups.changed_days(db, since)
+
+    assert days == {'u1': {'2024-05-01', '2024-05-02'}, 'u2': {'2024-05-02'}}
+    assert len(markers) == 1
+
+
+def daily(db, user_id):
+    return {row['day']: row for row in db[rollups.DAILY_ROLLUPS_COLLECTION].find({'user_id': user_id})}
+
+
+def test_refresh_days_rewrites_only_the_touched_days(server_db):
+    server_db['tasks'].insert_many([
+        {'user_id': 'u1', 'due_date': MAY_1, 'status': 'completed'},
+        {'user_id': 'u1', 'due_date': MAY_2, 'status': 'pending'},
+        {'user_id': 'u1', 'due_date': 'someday', 'status': 'pending'},
+    ])
+    server_db['diary'].insert_one({'user_id': 'u1', 'date': MAY_3, 'word_count': 7})
+    rollups.refresh_daily(server_db, ['u1'])
+    before = daily(server_db, 'u1')
+    assert set(before) == {'2024-05-01', '2024-05-02', '2024-05-03'}
+    assert before['2024-05-03']['diary_words'] == 7
+
+    # The May 2 task moves to May 3
+    server_db['tasks'].update_one({'due_date': MAY_2}, {'$set': {'due_date': MAY_3}})
+    rollups.refresh_days(server_db, {'u1': {'2024-05-02', '2024-05-03'}})
+    after = daily(server_db, 'u1')
+
+    assert set(after) == {'2024-05-01', '2024-05-03'}
+    assert after['2024-05-01']['computed_at'] == before['2024-05-01']['computed_at']
+    assert after['2024-05-03']['tasks_pending'] == 1
+    assert after['2024-05-03']['diary_entries'] == 1
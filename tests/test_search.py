@@ -0,0 +1,58 @@
+from datetime import datetime
+
+from markupsafe import Markup
+
+import search
+from indexes import ensure_indexes
+
+
+def test_tokenize_keeps_plain_distinct_words_only():
+    assert search.tokenize('Run, run! a (.*) Ünïcode') == ['run', 'ünïcode']
+    assert len(search.tokenize(' '.join(f'w{i}' for i in range(40)))) == search.MAX_QUERY_TERMS
+    assert search.tokenize('x' * 100) == ['x' * search.MAX_TERM_LENGTH]
+
+
+def test_highlight_escapes_text_and_marks_word_prefixes():
+    html = search.highlight('<b>Running</b> late', ['run'])
+
+    assert isinstance(html, Markup)
+    assert html == '&lt;b&gt;<mark>Running</mark>&lt;/b&gt; late'
+
+
+def test_highlight_keeps_a_window_around_the_first_match():
+    text = 'a ' * 100 + 'needle' + ' b' * 100
+
+    html = search.highlight(text, ['needle'], length=60)
+
+    assert html.startswith('…') and html.endswith('…')
+    assert '<mark>needle</mark>' in html
+    assert len(html.striptags()) <= 62
+
+
+def test_a_query_without_terms_runs_no_search():
+    page, terms = search.search_entries(None, 'u1', '!! ?')
+
+    assert (list(page), terms) == ([], [])
+
+
+def test_results_are_ranked_and_paged_by_offset(server_db):
+    ensure_indexes(server_db)
+    diary = server_db['diary']
+    # Same length, more mentions of the term: a higher text score
+    diary.insert_many([{'user_id': 'u1', 'title': f'entry {i}',
+                        'entry': 'garden ' * (i + 1) + 'filler ' * (10 - i),
+                        'date': datetime(2030, 1, i + 1)} for i in range(5)])
+    diary.insert_one({'user_id': 'u2', 'title': 'other', 'entry': 'garden garden garden',
+                      'date': datetime(2030, 1, 1)})
+
+    first, terms = search.search_entries(diary, 'u1', 'Garden', page_size=2)
+    second, _ = search.search_entries(diary, 'u1', 'garden', after=first.next_cursor, page_size=2)
+    third, _ = search.search_entries(diary, 'u1', 'garden', after=second.next_cursor, page_size=2)
+    back, _ = search.search_entries(diary, 'u1', 'garden', before=second.prev_cursor, page_size=2)
+
+    assert terms == ['garden']
+    titles = [item['title'] for page in (first, second, third) for item in page]
+    assert titles == [f'entry {i}' for i in range(4, -1, -1)]
+    assert third.next_cursor is None
+    assert [item['title'] for item in back] == [item['title'] for item in first]
+    assert '<mark>garden</mark>' in first.items[0]['snippet']
@@ -0,0 +1,91 @@
+import io
+import json
+import time
+from datetime import datetime
+
+import data_version
+import fanout
+import stats
+
+
+def fake_stats(user_id, tasks_total=0):
+    return {'_id': user_id, 'tasks_total': tasks_total, 'tasks_by_status': {'pending': tasks_total},
+            'diary_total': 0, 'diary_by_month': {}}
+
+
+def test_dashboard_materializes_stats_slower_than_the_page_deadline(monkeypatch, client, app_db, user_id):
+    monkeypatch.setattr(fanout, 'FANOUT_DEADLINE_MS', 20)
+
+    def slow_compute(db, uid):
+        time.sleep(0.1)
+        return fake_stats(uid, 3)
+    monkeypatch.setattr(stats, 'compute_user_stats', slow_compute)
+
+    assert client.get('/dashboard').status_code == 200
+    assert app_db[stats.STATS_COLLECTION].find_one({'_id': user_id})['tasks_total'] == 3
+
+
+def test_import_succeeds_when_the_stats_refresh_fails(monkeypatch, client, app_db, user_id):
+    app_db[stats.STATS_COLLECTION].insert_one(fake_stats(user_id))
+
+    def fail(db, uid):
+        raise RuntimeError('aggregation timed out')
+    monkeypatch.setattr(stats, 'compute_user_stats', fail)
+    version = data_version.get_version(app_db, user_id)
+
+    rows = '\n'.join(json.dumps({'name': f'task {i}', 'due_date': '2030-01-01'}) for i in range(3))
+    response = client.post('/tasks/import', data={'file': (io.BytesIO(rows.encode()), 'tasks.ndjson')},
+                           headers={'Accept': 'application/json'})
+
+    assert response.status_code == 200
+    assert response.get_json()['inserted'] == 3
+    assert app_db['tasks'].count_documents({'user_id': user_id}) == 3
+    # Dropped rather than left stale; rebuilt on the next read
+    assert app_db[stats.STATS_COLLECTION].find_one({'_id': user_id}) is None
+    assert data_version.get_version(app_db, user_id) != version
+
+
+def test_bulk_update_succeeds_when_the_stats_refresh_fails(monkeypatch, client, app_db, user_id):
+    task_id = app_db['tasks'].insert_one({'user_id': user_id, 'name': 't', 'status': 'pending'}).inserted_id
+
+    def fail(db, uid):
+        raise RuntimeError('aggregation timed out')
+    monkeypatch.setattr(stats, 'compute_user_stats', fail)
+
+    response = client.post('/tasks/bulk', data={'task_ids': [str(task_id)], 'action': 'complete'})
+
+    assert response.status_code == 302
+    assert app_db['tasks'].find_one({'_id': task_id})['status'] == 'completed'
+    with client.session_transaction() as session:
+        assert ('success', '1 task(s) updated.') in session['_flashes']
+
+
+def test_month_key_skips_legacy_strings():
+    assert stats.month_key(datetime(2024, 5, 17)) == '2024-05'
+    assert stats.month_key('someday') is None
+    assert stats.month_key(None) is None
+
+
+def test_deleting_a_legacy_diary_entry_keeps_the_bookkeeping(client, app_db, user_id):
+    app_db[stats.STATS_COLLECTION].insert_one(dict(fake_stats(user_id), diary_total=1))
+    entry_id = app_db['diary'].insert_one({'user_id': user_id, 'title': 'old', 'content': '',
+                                           'date': 'someday'}).inserted_id
+    version = data_version.get_version(app_db, user_id)
+
+    client.get(f'/delete_diary/{entry_id}')
+
+    with client.session_transaction() as session:
+        assert ('success', 'Diary entry deleted successfully!') in session['_flashes']
+    assert app_db['tombstones'].count_documents({'user_id': user_id}) == 1
+    assert app_db[stats.STATS_COLLECTION].find_one({'_id': user_id})['diary_total'] == 0
+    assert data_version.get_version(app_db, user_id) != version
+
+
+def test_stats_rebuild_counts_legacy_dates_in_no_month(server_db):
+    server_db['diary'].insert_many([
+        {'user_id': 'u1', 'date': datetime(2024, 5, 17)},
+        {'user_id': 'u1', 'date': 'someday'},
+    ])
+    computed = stats.compute_user_stats(server_db, 'u1')
+    assert computed['diary_total'] == 2
+    assert computed['diary_by_month'] == {'2024-05': 1}
@@ -0,0 +1,57 @@
+from datetime import timedelta
+
+import pytest
+
+import sync
+from dates import utcnow
+from pagination import encode_token
+
+
+def names(body):
+    return [task['name'] for task in body['tasks']]
+
+
+def test_sync_pages_through_settled_changes(db, add_task):
+    old = utcnow() - timedelta(minutes=5)
+    for i in range(5):
+        add_task(db, name=f't{i}', updated_at=old + timedelta(seconds=i))
+
+    first = sync.sync_changes(db, 'u1', page_size=2)
+    second = sync.sync_changes(db, 'u1', first['next_token'], page_size=2)
+    third = sync.sync_changes(db, 'u1', second['next_token'], page_size=2)
+
+    assert (names(first), first['has_more']) == (['t0', 't1'], True)
+    assert (names(second), second['has_more']) == (['t2', 't3'], True)
+    assert (names(third), third['has_more']) == (['t4'], False)
+
+
+def test_full_page_does_not_skip_late_commits(db, add_task):
+    now = utcnow()
+    add_task(db, name='settled', updated_at=now - timedelta(minutes=5))
+    add_task(db, name='recent', updated_at=now)
+    add_task(db, name='newest', updated_at=now + timedelta(milliseconds=1))
+
+    first = sync.sync_changes(db, 'u1', page_size=2)
+    assert names(first) == ['settled', 'recent']
+    # The page ends inside the settle window: no immediate re-fetch
+    assert first['has_more'] is False
+
+    # A write stamped before 'recent' that committed after the first sync
+    add_task(db, name='late', updated_at=now - timedelta(seconds=1))
+    second = sync.sync_changes(db, 'u1', first['next_token'], page_size=2)
+    assert 'late' in names(second)
+
+
+def test_deletions_come_back_as_tombstones(db):
+    sync.record_deletions(db, 'u1', 'task', ['abc'])
+    body = sync.sync_changes(db, 'u1')
+    assert [(tombstone['kind'], tombstone['id']) for tombstone in body['deleted']] == [('task', 'abc')]
+
+
+@pytest.mark.parametrize('state', [{'issued_at': 'yesterday'}, {'tasks': None},
+                                   {'issued_at': utcnow(), 'tasks': 3}, ['issued_at']])
+def test_well_formed_tokens_with_wrong_contents_are_a_400(client, state):
+    response = client.get('/api/v1/sync', query_string={'since': encode_token(state)})
+
+    assert response.status_code == 400
+    assert 'invalid sync token' in response.get_json()['error']
@@ -0,0 +1,30 @@
+import tag_catalogue
+
+
+def seed(db, counts):
+    db[tag_catalogue.TAGS_COLLECTION].insert_many(
+        [{'user_id': 'u1', 'tag': tag, 'count': count} for tag, count in counts.items()])
+
+
+def test_suggestions_keep_the_most_used_tags(db):
+    counts = {f'work{i:02d}': 1 for i in range(12)}
+    counts['workout'] = 500
+    counts['weekend'] = 900
+    seed(db, counts)
+
+    suggestions = tag_catalogue.suggest_tags(db, 'u1', 'work', limit=10)
+
+    assert len(suggestions) == 10
+    assert suggestions[0] == {'tag': 'workout', 'count': 500}
+    assert [doc['tag'] for doc in suggestions[1:]] == [f'work{i:02d}' for i in range(9)]
+
+
+def test_suggestions_escape_the_prefix_and_skip_unused_tags(db):
+    seed(db, {'c++': 3, 'cxx': 5, 'c+old': 0})
+    assert tag_catalogue.suggest_tags(db, 'u1', 'c+') == [{'tag': 'c++', 'count': 3}]
+
+
+def test_record_tags_change_moves_counts(db):
+    tag_catalogue.record_tags_change(db, 'u1', [], ['a', 'b'])
+    tag_catalogue.record_tags_change(db, 'u1', ['a', 'b'], ['b', 'c'])
+    assert tag_catalogue.list_tags(db, 'u1') == ['b', 'c']
@@ -0,0 +1,27 @@
+import passwords
+from user_context import user_cache
+
+
+def test_password_upgrade_goes_through_update_user(monkeypatch, app, app_db, user_id):
+    import app as app_module
+    monkeypatch.setattr(passwords, 'hash_password', lambda password: 'new-hash')
+    user = app_db['users'].find_one()
+    user_cache.set(user_id, {'_id': user['_id'], 'email': user['email']})
+
+    with app.test_request_context():
+        app_module.upgrade_password_hash(user, 'secret')
+
+    assert app_db['users'].find_one()['password'] == 'new-hash'
+    assert user_cache.get(user_id) is None
+
+
+def test_password_upgrade_leaves_a_changed_password_alone(monkeypatch, app, app_db, user_id):
+    import app as app_module
+    monkeypatch.setattr(passwords, 'hash_password', lambda password: 'new-hash')
+    user = app_db['users'].find_one()
+    app_db['users'].update_one({'_id': user['_id']}, {'$set': {'password': 'changed'}})
+
+    with app.test_request_context():
+        app_module.upgrade_password_hash(user, 'secret')
+
+    assert app_db['users'].find_one()['password'] == 'changed'
@@ -0,0 +1,52 @@
+"""Current-user resolution shared by the auth decorators and views.
+
+The user document is looked up at most once per request (memoized on
+``flask.g``) and, across requests, served from a bounded TTL cache. Any
+code that modifies a user record must go through ``update_user()`` or
+call ``invalidate_user()`` so the cached copy is dropped.
+"""
+
+import os
+
+from bson.objectid import ObjectId
+from flask import g, session
+
+from cache import TTLCache
+
+# Only what the request path needs; the password hash never enters the cache
+USER_FIELDS = {'email': 1, 'role': 1, 'created_at': 1}
+
+user_cache = TTLCache(
+    maxsize=int(os.getenv('USER_CACHE_SIZE', '1024')),
+    ttl=float(os.getenv('USER_CACHE_TTL', '300')),
+)
+
+
+def load_user(users_collection, user_id):
+    user = user_cache.get(user_id)
+    if user is None:
+        user = users_collection.find_one({'_id': ObjectId(user_id)}, USER_FIELDS)
+        if user is not None:
+            user_cache.set(user_id, user)
+    return user
+
+
+def get_current_user(users_collection):
+    """The logged-in user's document, or None."""
+    if 'current_user' not in g:
+        user_id = session.get('user_id')
+        g.current_user = load_user(users_collection, user_id) if user_id else None
+    return g.current_user
+
+
+def invalidate_user(user_id):
+    user_cache.pop(str(user_id))
+    if g and g.get('current_user') and str(g.current_user['_id']) == str(user_id):
+        g.pop('current_user')
+
+
+def update_user(users_collection, user_id, update, query=None):
+    """Apply ``update`` to the user, only if it also matches ``query`` when given."""
+    result = users_collection.update_one({**(query or {}), '_id': ObjectId(user_id)}, update)
+    invalidate_user(user_id)
+    return result